@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import engine
+
+# Options of the benchmarked rename: the expensive stages plus a conflict
+# strategy that has to resolve the collisions the fix rules create
+BENCHMARK_OPTIONS = engine.make_options(
+    apply_fix=True, use_regex=True, replace_text=r'\s*\((?:19|20)\d\d\)', with_text='',
+    prefix='Archive ', skip_existing_prefix=True, conflict_strategy='Rename')
+
+WORDS = ['song', 'Live', 'final', 'IMG', 'draft', 'Report', 'holiday', 'remix', 'scan', 'DSC',
+         'Über', 'café', 'naïve', 'Ελλάδα', 'Москва', '東京', 'résumé', 'photo', 'video', 'backup']
+EXTENSIONS = ['.jpg', '.JPG', '.png', '.mp3', '.flac', '.mp4', '.pdf', '.txt', '.tar.gz', '']
+PHASES = ['create', 'scan', 'preview', 'plan', 'gui_model', 'commit']
+
+# Every startup is a fresh interpreter running one of these, timed from the outside
+STARTUP_SCRIPTS = {
+    'interpreter': 'pass',
+    'engine': 'import engine',
+    'cli': 'import cli',
+    'first_window': (
+        'from PyQt6.QtWidgets import QApplication\n'
+        'import gui\n'
+        'app = QApplication([])\n'
+        'window = gui.REnamer()\n'
+        'window.show()\n'
+        'app.processEvents()\n'),
+}
+# Seconds each startup may take, best run, interpreter included
+STARTUP_BUDGETS = {'interpreter': 0.05, 'engine': 0.1, 'cli': 0.12, 'first_window': 1.5}
+# Modules that must stay importable without PyQt6
+HEADLESS_MODULES = ['engine', 'cli', 'daemon', 'journal', 'hashcache', 'watcher', 'settings', 'main']
+
+
+def parse_size(text):
+    """ '1k' -> 1000, '1M' -> 1000000. """
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:].lower(), 1)
+    return int(float(text.rstrip('kKmM')) * multiplier)
+
+
+def make_name(rng):
+    """ A file name shaped like the ones REnamer is used on. """
+    words = [rng.choice(WORDS) for _ in range(rng.randint(1, 4))]
+    style = rng.randrange(5)
+    if style == 0:
+        stem = ' '.join(words[:2]) + ' - ' + ' '.join(words[2:] or ['Title']) + f' ({rng.randint(1990, 2024)})'
+    elif style == 1:
+        stem = f'{rng.choice(["IMG", "DSC", "VID"])}_{rng.randint(20100101, 20241231)}_{rng.randint(0, 999999):06d}'
+    elif style == 2:
+        stem = words[0].lower() + ''.join(word.title() for word in words[1:]) + f'-v{rng.randint(1, 9)}'
+    elif style == 3:
+        stem = '-'.join(words) + f' [{rng.choice(["HD", "4K", "copy"])}]'
+    else:
+        stem = '  '.join(words).upper() + f'_{rng.randint(1, 99)}'
+    return stem + rng.choice(EXTENSIONS)
+
+
+def generate_names(count, seed):
+    """
+    count distinct names (case-insensitively, so they fit any file system). About
+    one in ten is a variant of an earlier name that only differs in case or
+    punctuation, so the fix rules make them collide.
+    """
+    rng = random.Random(seed)
+    names = []
+    seen = set()
+    while len(names) < count:
+        if names and rng.random() < 0.1:
+            stem, ext = os.path.splitext(rng.choice(names))
+            name = rng.choice([stem.swapcase(), stem.replace(' ', '-'), stem + '!', stem.replace('_', ' ')]) + ext
+        else:
+            name = make_name(rng)
+        if name.lower() not in seen and name.strip() == name:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def best_of(repeat, function):
+    """ Run function repeat times and return (best seconds, last result). """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def plan_all(names, options, processes=1):
+    index = engine.NameIndex(names)
+    chains = 0
+    for batch in engine.iter_plan(names, options, processes=processes):
+        moves, _ = engine.plan_batch(batch, index, options['conflict_strategy'])
+        chains += len(engine.order_moves(moves, index))
+    return chains
+
+
+def populate_model(names, options):
+    """ Fill the GUI model the way REnamer does: scan batches, then the preview column. """
+    from gui import FileListModel, SCAN_BATCH_SIZE, PREVIEW_CHUNK_SIZE
+    model = FileListModel()
+    store = engine.EntryStore()
+    model.set_store(store)
+    for start in range(0, len(names), SCAN_BATCH_SIZE):
+        model.append_rows(store.extend(names[start:start + SCAN_BATCH_SIZE]))
+    for start, previews in engine.iter_previews(names, options, chunk_size=PREVIEW_CHUNK_SIZE):
+        model.set_preview_range(start, previews)
+    return model.rowCount()
+
+
+def gui_available():
+    try:
+        from PyQt6.QtCore import QCoreApplication
+    except ImportError:
+        return False
+    if QCoreApplication.instance() is None:
+        gui_available.app = QCoreApplication([])  # Models need an application object
+    return True
+
+
+def run_size(root, count, options, repeat, seed, phases, processes=1):
+    """ Benchmark every phase on a fresh folder of count files. Returns {phase: result}. """
+    folder = tempfile.mkdtemp(prefix=f'renamer-bench-{count}-', dir=root)
+    results = {}
+
+    def record(phase, seconds, items):
+        results[phase] = {'seconds': round(seconds, 6), 'items': items,
+                          'per_second': round(items / seconds) if seconds else None}
+        print(f'  {phase:<10} {seconds:10.4f} s  {items / seconds if seconds else 0:14,.0f} /s', file=sys.stderr)
+
+    try:
+        names = generate_names(count, seed)
+        started = time.perf_counter()
+        for name in names:
+            open(os.path.join(folder, name), 'w').close()
+        record('create', time.perf_counter() - started, count)
+
+        if 'scan' in phases:
+            seconds, scanned = best_of(repeat, lambda: engine.list_files(folder, index=engine.NameIndex()))
+            record('scan', seconds, len(scanned))
+        if 'preview' in phases:
+            seconds, _ = best_of(repeat, lambda: sum(len(chunk) for _, chunk in engine.iter_previews(names, options)))
+            record('preview', seconds, count)
+        if 'plan' in phases:
+            seconds, _ = best_of(repeat, lambda: plan_all(names, options, processes))
+            record('plan', seconds, count)
+        if 'gui_model' in phases:
+            if gui_available():
+                seconds, _ = best_of(repeat, lambda: populate_model(names, options))
+                record('gui_model', seconds, count)
+            else:
+                print('  gui_model  skipped, PyQt6 is not installed', file=sys.stderr)
+        if 'commit' in phases:
+            # Changes the folder, so it runs once and last
+            started = time.perf_counter()
+            renamed = 0
+            for history, _ in engine.rename_folder(folder, options, processes=processes):
+                renamed += len(history)
+            record('commit', time.perf_counter() - started, renamed)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def run_startup(repeat):
+    """
+    Time a cold start of the interpreter, of the headless imports and of the
+    GUI up to its first shown window, against STARTUP_BUDGETS. Returns
+    ({startup: result}, names of the startups over budget).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    if sys.platform.startswith('linux') and not (env.get('DISPLAY') or env.get('WAYLAND_DISPLAY')):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    check = f'import sys, {", ".join(HEADLESS_MODULES)}; sys.exit("PyQt6" in sys.modules)'
+    if subprocess.run([sys.executable, '-c', check], cwd=here, env=env).returncode != 0:
+        raise SystemExit(f'One of {", ".join(HEADLESS_MODULES)} imports PyQt6')
+
+    results = {}
+    over_budget = []
+    for name, script in STARTUP_SCRIPTS.items():
+        if name == 'first_window' and not gui_available():
+            print(f'  {name:<12} skipped, PyQt6 is not installed', file=sys.stderr)
+            continue
+        seconds, _ = best_of(repeat, lambda: subprocess.run([sys.executable, '-c', script], cwd=here, env=env,
+                                                            check=True))
+        budget = STARTUP_BUDGETS[name]
+        results[name] = {'seconds': round(seconds, 6), 'budget': budget}
+        if seconds > budget:
+            over_budget.append(name)
+        print(f'  {name:<12} {seconds * 1000:8.1f} ms  budget {budget * 1000:6.0f} ms'
+              f'{"  OVER" if seconds > budget else ""}', file=sys.stderr)
+    return results, over_budget
+
+
+def compare(results, baseline):
+    """ Print the change of every phase against a previous run. """
+    print(f'{"files":>9} {"phase":<10} {"baseline":>10} {"now":>10} {"change":>8}')
+    for size, phases in results.items():
+        for phase, result in phases.items():
+            before = baseline.get(size, {}).get(phase)
+            if before is None or not before['seconds']:
+                continue
+            change = result['seconds'] / before['seconds'] - 1
+            print(f'{size:>9} {phase:<10} {before["seconds"]:10.4f} {result["seconds"]:10.4f} {change:+8.1%}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='benchmark', description='Time the scan, preview, plan and commit phases on synthetic folders.')
+    parser.add_argument('--sizes', default='1k,100k', help='Comma separated file counts, e.g. 1k,100k,1M.')
+    parser.add_argument('--dir', help='Where the folders are created (default: /dev/shm when present).')
+    parser.add_argument('--phases', default=','.join(PHASES[1:]), help='Comma separated phases to time.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per phase, the best one is kept.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=1, help='Plan processes (0 = one per core).')
+    parser.add_argument('--preset', help='Benchmark this preset instead of the built-in options.')
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare with the results of an earlier run.')
+    parser.add_argument('--startup', action='store_true',
+                        help='Time cold imports and the first window instead; exits with 1 over budget.')
+    args = parser.parse_args(argv)
+
+    root = args.dir or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+    options = engine.load_options(args.preset) if args.preset else BENCHMARK_OPTIONS
+    phases = set(args.phases.split(','))
+
+    results = {}
+    over_budget = []
+    if args.startup:
+        print('Startup', file=sys.stderr)
+        results['startup'], over_budget = run_startup(max(1, args.repeat))
+    else:
+        for size in args.sizes.split(','):
+            count = parse_size(size)
+            print(f'{count:,} files in {root}', file=sys.stderr)
+            results[str(count)] = run_size(root, count, options, max(1, args.repeat), args.seed, phases,
+                                             args.processes)
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'directory': root,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'processes': args.processes,
+        'options': options,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f)['results'])
+    if over_budget:
+        print(f'Over the startup budget: {", ".join(over_budget)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import sys
+import re
+import argparse
+
+import engine
+import planfile
+from journal import RenameJournal
+from instrumentation import TRACE
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='renamer', description='Batch rename files in a folder without starting the GUI.')
+    parser.add_argument('folder', nargs='?', help='Folder containing the files to rename.')
+    parser.add_argument('--preset', help='Preset JSON file saved from REnamer.')
+    parser.add_argument('--prefix', help='Text to add at the beginning of file names. May hold the metadata '
+                                         'tokens {date}, {time}, {size}, {size_kb}, {mtime:FORMAT} and '
+                                         '{hash} or {hash:N} for the first characters of the SHA-256 digest.')
+    parser.add_argument('--suffix', help='Text to add at the end of file names (before extension), '
+                                         'with the same tokens as --prefix.')
+    parser.add_argument('--replace', dest='replace_text', help='Text to replace in file names.')
+    parser.add_argument('--with', dest='with_text', help='Replacement text.')
+    parser.add_argument('--regex', dest='use_regex', action='store_true', default=None,
+                        help='Treat --replace as a regular expression.')
+    parser.add_argument('--case', dest='case_option',
+                        choices=['None', 'lowercase', 'UPPERCASE', 'Title Case', 'Sentence case'])
+    parser.add_argument('--fix', dest='apply_fix', action='store_true', default=None,
+                        help='Apply predefined fix rules to file names.')
+    parser.add_argument('--ext', dest='filter_extension',
+                        help='Only rename files with this extension. Separate several with commas; '
+                             'wildcards match the file name (IMG_*.jp*g).')
+    parser.add_argument('-r', '--recursive', dest='include_subfolders', action='store_true', default=None,
+                        help='Include files in subfolders.')
+    parser.add_argument('--max-depth', type=int, help='Subfolder levels to descend (0 = no limit).')
+    parser.add_argument('--sort', dest='sort_by', choices=['None', 'Name', 'Modified', 'Size'],
+                        help='Order the files are numbered in (default: as listed by the file system).')
+    parser.add_argument('--number-per-folder', dest='numbering_per_folder', action='store_true', default=None,
+                        help='Restart numbering in every subfolder.')
+    parser.add_argument('--on-conflict', dest='conflict_strategy', choices=['Skip', 'Overwrite', 'Rename'])
+    parser.add_argument('--dry-run', dest='simulation_mode', action='store_true', default=None,
+                        help='Print the plan without renaming anything.')
+    parser.add_argument('--stop-on-error', dest='stop_on_error', action='store_true', default=None,
+                        help='Stop at the first failed rename instead of collecting all errors.')
+    parser.add_argument('--batch-size', type=int, default=engine.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=engine.DEFAULT_RENAME_WORKERS,
+                        help='Renames issued concurrently.')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Processes computing the new names of large folders (0 = one per core).')
+    parser.add_argument('--journal', help='Record renames in this journal file for crash recovery and undo. '
+                                          'Interrupted batches found in it are rolled back first.')
+    parser.add_argument('--replay', action='store_true',
+                        help='Finish interrupted batches found in the journal instead of rolling them back.')
+    parser.add_argument('--undo', action='store_true', help='Undo the last batch recorded in the journal.')
+    parser.add_argument('--hash-cache', help='Keep file digests in this file, so unchanged files are not '
+                                             'read again by later runs.')
+    parser.add_argument('--export-plan', metavar='FILE',
+                        help='Write the plan, every file with its new name and conflict decision, to this .jsonl '
+                             'or .csv file instead of renaming.')
+    parser.add_argument('--apply-plan', metavar='FILE',
+                        help='Rename as recorded in a plan file from --export-plan, in the folder argument if '
+                             'given, else in the folder the plan was made for.')
+    parser.add_argument('--duplicates', action='store_true',
+                        help='List files with identical contents instead of renaming.')
+    parser.add_argument('--trace', help='Time every phase, count system calls and write the results '
+                                        'to this JSON file.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only report errors.')
+    return parser
+
+
+def undo_last(journal, quiet):
+    committed = journal.committed()
+    if not committed:
+        print('Nothing to undo.', file=sys.stderr)
+        return 0
+    failed = 0
+    for old_path, new_path, e in journal.undo(committed[-1].batch_id):
+        if e is not None:
+            failed += 1
+            print(f'Failed to undo rename {new_path}: {e}', file=sys.stderr)
+        elif not quiet:
+            print(f'{new_path} -> {old_path}')
+    return 1 if failed else 0
+
+
+def list_duplicates(folder, options, hash_cache, quiet):
+    stats = engine.StatCache(folder, hash_cache)
+    names = engine.list_files(folder, options['filter_extension'], options['include_subfolders'],
+                              options['max_depth'], stats=stats)
+    groups = engine.find_duplicates(names, stats)
+    if not quiet:
+        for digest, size, group in groups:
+            print(f'{digest[:16]}  {size:,} bytes')
+            for name in group:
+                print(f'    {name}')
+    wasted = sum(size * (len(group) - 1) for _, size, group in groups)
+    print(f'{len(groups)} group(s) of duplicates, {wasted:,} bytes in extra copies.', file=sys.stderr)
+    return 0
+
+
+def export_plan(args, options, hash_cache):
+    try:
+        counts = planfile.export_plan(args.export_plan, args.folder, options, args.batch_size, args.processes,
+                                      hash_cache)
+    except (OSError, re.error) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+    print(f'Wrote the plan of {sum(counts.values())} file(s) to {args.export_plan}: '
+          + ', '.join(f'{count} {action}' for action, count in counts.items()) + '.', file=sys.stderr)
+    report_trace(args)
+    return 0
+
+
+def report_trace(args):
+    if args.trace:
+        TRACE.export(args.trace)
+        if not args.quiet:
+            print(TRACE.summary(), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.undo and not args.journal:
+        parser.error('--undo needs --journal')
+    if not args.folder and not args.undo and not args.apply_plan:
+        parser.error('the folder argument is required')
+    if args.export_plan and args.apply_plan:
+        parser.error('--export-plan and --apply-plan exclude each other')
+
+    TRACE.enabled = bool(args.trace)
+    journal = None
+    if args.journal:
+        journal = RenameJournal(args.journal)
+        for old_path, new_path, e in journal.recover(replay=args.replay):
+            print(f'Failed to recover {new_path}: {e}', file=sys.stderr)
+        if args.undo:
+            return undo_last(journal, args.quiet)
+
+    preset = engine.load_options(args.preset) if args.preset else None
+    overrides = {key: getattr(args, key) for key in engine.DEFAULT_OPTIONS if hasattr(args, key)}
+    options = engine.make_options(preset, **overrides)
+
+    hash_cache = None
+    if args.hash_cache:
+        from hashcache import HashCache  # Loads hashlib, which most runs don't need
+        hash_cache = HashCache(args.hash_cache)
+    if args.duplicates:
+        try:
+            code = list_duplicates(args.folder, options, hash_cache, args.quiet)
+        except OSError as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 2
+        report_trace(args)
+        return code
+
+    if args.export_plan:
+        return export_plan(args, options, hash_cache)
+
+    if args.apply_plan:
+        batches = planfile.apply_plan(args.apply_plan, args.folder, args.workers, journal,
+                                      bool(args.simulation_mode), bool(args.stop_on_error))
+    else:
+        batches = engine.rename_folder(args.folder, options, args.batch_size, args.workers, journal,
+                                       args.processes, hash_cache)
+    renamed = 0
+    failed = 0
+    try:
+        for history, errors in batches:
+            renamed += len(history)
+            failed += len(errors)
+            if not args.quiet:
+                for old_path, new_path in history:
+                    print(f'{old_path} -> {new_path}')
+            for old_name, e in errors:
+                print(f'Failed to rename {old_name}: {e}', file=sys.stderr)
+    except (OSError, re.error, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+    action = 'Would rename' if options['simulation_mode'] else 'Renamed'
+    print(f'{action} {renamed} file(s), {failed} failed.', file=sys.stderr)
+    report_trace(args)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
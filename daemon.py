@@ -0,0 +1,304 @@
+import os
+import re
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import engine
+from journal import RenameJournal
+from hashcache import HashCache
+from instrumentation import TRACE
+from watcher import open_watcher, InotifyWatcher
+
+# Folders whose listing is kept warm; the least recently used one is dropped first
+MAX_WARM_FOLDERS = 16
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(runtime_dir, f'renamer-{os.getuid()}.sock')
+
+
+class FolderState:
+    """
+    A listed folder kept up to date between jobs: the names in scan order, the
+    NameIndex used for conflict checks and the StatCache of the files,
+    followed through an inotify watcher instead of reading the folder again.
+    Jobs on one folder take turns through lock. Without inotify the folder is
+    read for every job.
+    """
+
+    def __init__(self, folder, include_subfolders, max_depth, hash_cache=None):
+        self.folder = folder
+        self.hash_cache = hash_cache
+        self.include_subfolders = include_subfolders
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+        # Watching starts before the scan, so nothing added in between is missed
+        self.watcher = open_watcher(folder, include_subfolders, max_depth)
+        self.warm = isinstance(self.watcher, InotifyWatcher)
+        try:
+            self.scan()
+        except OSError:
+            self.watcher.close()
+            raise
+
+    def scan(self):
+        self.index = engine.NameIndex()
+        self.stats = engine.StatCache(self.folder, self.hash_cache)
+        with TRACE.phase('scan') as phase:
+            self.names = dict.fromkeys(engine.list_files(self.folder, include_subfolders=self.include_subfolders,
+                                                         max_depth=self.max_depth, index=self.index,
+                                                         stats=self.stats))
+            phase.add(len(self.names))
+
+    def refresh(self):
+        """
+        Apply what changed since the last job. Every change is checked against
+        the disk, so the echoes of the daemon's own renames are dropped.
+        """
+        if not self.warm:
+            self.scan()
+            return
+        changes = self.watcher.read(0)
+        changes += self.watcher.read(0)  # Settles moves out of the folder, reported one read late
+        if any(kind == 'overflow' for kind, _, _ in changes):
+            self.scan()
+            return
+
+        def exists(name):
+            return os.path.lexists(os.path.join(self.folder, name))
+
+        for kind, name, new_name in changes:
+            if kind == 'moved':
+                if name in self.names and not exists(name):
+                    del self.names[name]
+                    self.index.discard(name)
+                    if new_name not in self.names and exists(new_name):
+                        self.stats.rename([(name, new_name)], digests=False)
+                    else:
+                        self.stats.discard([name])
+                if new_name not in self.names and exists(new_name):
+                    self.names[new_name] = None
+                    self.index.add(new_name)
+            elif kind == 'deleted_dir':
+                prefix = name + os.sep
+                listed = [listed for listed in self.names if listed.startswith(prefix)]
+                for gone in listed:
+                    del self.names[gone]
+                    self.index.discard(gone)
+                self.stats.discard(listed)
+                self.index.discard(name)
+            elif kind == 'created':
+                self.stats.discard([name])  # It may replace a file whose stat is cached
+                if name not in self.names and exists(name):
+                    self.names[name] = None
+                    self.index.add(name)
+            elif kind == 'modified':
+                self.stats.discard([name])
+            elif name in self.names and not exists(name):
+                del self.names[name]
+                self.index.discard(name)
+                self.stats.discard([name])
+
+    def applied(self, history):
+        """ Follow the renames of a committed batch; the index already did, the stats follow in renamed(). """
+        for old_path, new_path in history:
+            self.names.pop(os.path.relpath(old_path, self.folder), None)
+            self.names[os.path.relpath(new_path, self.folder)] = None
+
+    def renamed(self, pairs):
+        """ Move the stats of a finished job's (old_name, new_name) renames; the digests moved with each batch. """
+        self.stats.rename(pairs, digests=False)
+
+    def close(self):
+        self.watcher.close()
+
+
+class RenameDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves rename jobs over a Unix socket, one JSON object per line:
+        {"id": ..., "folder": ..., "options": {...}}
+    where options is a preset as saved by REnamer ({"simulation_mode": true}
+    for a dry run). Every job is answered with a line per batch,
+        {"id": ..., "event": "batch", "renamed": [[old, new], ...], "errors": [[name, message], ...]}
+    names relative to folder, then {"id": ..., "event": "done", "renamed": n,
+    "failed": n, "seconds": t}, or {"id": ..., "event": "error", "message": ...}.
+    {"command": "ping"} is answered with {"event": "pong"}, {"command": "forget",
+    "folder": ...} drops the warm listing of a folder.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, journal=None, hash_cache=None, workers=engine.DEFAULT_RENAME_WORKERS):
+        self.journal = journal
+        self.hash_cache = hash_cache
+        self.workers = workers
+        self.folders = OrderedDict()  # (folder, include_subfolders, max_depth) -> FolderState
+        self._folders_lock = threading.Lock()
+        # The journal holds one batch at a time, so journaled jobs take turns
+        self._journal_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Left behind by a daemon that did not shut down cleanly
+        super().__init__(socket_path, JobHandler)
+
+    def server_bind(self):
+        # The socket is created with the umask's permissions: only the owner may connect
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def folder_state(self, folder, options):
+        key = (folder, bool(options['include_subfolders']), options['max_depth'])
+        with self._folders_lock:
+            state = self.folders.get(key)
+            if state is not None:
+                self.folders.move_to_end(key)
+                return state
+        state = FolderState(*key, self.hash_cache)  # Scans outside the lock, other folders keep being served
+        with self._folders_lock:
+            if key in self.folders:  # Another job listed it meanwhile
+                state.close()
+                return self.folders[key]
+            self.folders[key] = state
+            while len(self.folders) > MAX_WARM_FOLDERS:
+                _, dropped = self.folders.popitem(last=False)
+                dropped.close()
+        return state
+
+    def forget(self, folder):
+        with self._folders_lock:
+            for key in [key for key in self.folders if key[0] == folder]:
+                self.folders.pop(key).close()
+
+    def run_job(self, job, send):
+        """ Run one rename job, passing every reply line to send. """
+        folder = os.path.realpath(job['folder'])
+        options = engine.make_options(job.get('options'))
+        if not os.path.isdir(folder):
+            raise NotADirectoryError(f'{folder} is not a folder')
+        started = time.perf_counter()
+        state = self.folder_state(folder, options)
+        renamed = 0
+        failed = 0
+        moved = []  # Renames of the job, whose stats follow once the plan is done reading them
+        journal = None if options['simulation_mode'] else self.journal
+        with state.lock, self._journal_lock if journal is not None else nullcontext():
+            state.refresh()
+            matches = engine.compile_filter(options['filter_extension'])
+            names = [name for name in state.names if matches is None or matches(name)]
+            # A dry run plans against a copy, so the warm index keeps matching the disk
+            index = state.index.copy() if options['simulation_mode'] else state.index
+            stats = state.stats if engine.needs_stats(options) else None
+            try:
+                for history, errors in engine.rename_names(folder, names, index, options, workers=self.workers,
+                                                           journal=journal, stats=stats):
+                    pairs = [(os.path.relpath(old_path, folder), os.path.relpath(new_path, folder))
+                             for old_path, new_path in history]
+                    if not options['simulation_mode']:
+                        state.applied(history)
+                        moved.extend(pairs)
+                    renamed += len(history)
+                    failed += len(errors)
+                    send({'event': 'batch', 'renamed': [list(pair) for pair in pairs],
+                          'errors': [[name, str(e)] for name, e in errors]})
+            finally:
+                state.renamed(moved)
+        send({'event': 'done', 'renamed': renamed, 'failed': failed,
+              'seconds': round(time.perf_counter() - started, 6)})
+
+    def server_close(self):
+        super().server_close()
+        with self._folders_lock:
+            for state in self.folders.values():
+                state.close()
+            self.folders.clear()
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """ One client connection; its jobs are run in the order they arrive. """
+
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            job_id = None
+
+            def send(reply):
+                reply['id'] = job_id
+                self.wfile.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+            try:
+                job = json.loads(raw)
+                job_id = job.get('id')
+                command = job.get('command', 'rename')
+                if command == 'ping':
+                    send({'event': 'pong'})
+                elif command == 'forget':
+                    self.server.forget(os.path.realpath(job['folder']))
+                    send({'event': 'done'})
+                elif command == 'rename':
+                    self.server.run_job(job, send)
+                else:
+                    send({'event': 'error', 'message': f'Unknown command {command!r}'})
+            except BrokenPipeError:
+                return
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                send({'event': 'error', 'message': f'Bad job: {e!r}'})
+            except (OSError, re.error) as e:
+                send({'event': 'error', 'message': str(e)})
+
+
+def submit(job, socket_path=None):
+    """ Send one job to a running daemon and yield its reply lines as dicts, up to 'done' or 'error'. """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall(json.dumps(job, ensure_ascii=False).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as replies:
+            for raw in replies:
+                reply = json.loads(raw)
+                yield reply
+                if reply['event'] in ('done', 'error', 'pong'):
+                    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='renamer-daemon', description='Serve rename jobs over a Unix socket, keeping folder listings warm.')
+    parser.add_argument('--socket', default=default_socket_path(), help='Socket path (default: %(default)s).')
+    parser.add_argument('--journal', help='Record renames in this journal file for crash recovery and undo.')
+    parser.add_argument('--hash-cache', help='Keep file digests in this file.')
+    parser.add_argument('--workers', type=int, default=engine.DEFAULT_RENAME_WORKERS,
+                        help='Renames issued concurrently per job.')
+    args = parser.parse_args(argv)
+
+    journal = None
+    if args.journal:
+        journal = RenameJournal(args.journal)
+        for old_path, new_path, e in journal.recover():
+            print(f'Failed to recover {new_path}: {e}', file=sys.stderr)
+    hash_cache = HashCache(args.hash_cache) if args.hash_cache else None
+    server = RenameDaemon(args.socket, journal, hash_cache, args.workers)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Clean up the socket on kill too
+    print(f'Listening on {args.socket}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
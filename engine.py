@@ -0,0 +1,1373 @@
+import os
+import re
+import json
+import time
+import fnmatch
+import threading
+from functools import partial
+from operator import add, methodcaller
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from instrumentation import TRACE
+
+# Options understood by the engine. The keys match what REnamer.save_preset
+# writes, so a preset file can be fed straight into the engine or the CLI.
+DEFAULT_OPTIONS = {
+    'prefix': '',
+    'suffix': '',
+    'skip_existing_prefix': False,
+    'skip_existing_suffix': False,
+    'replace_text': '',
+    'with_text': '',
+    'use_regex': False,
+    'case_option': 'None',
+    'add_numbering': False,
+    'numbering_start': 1,
+    'numbering_increment': 1,
+    'numbering_padding': 1,
+    'numbering_position': 'Prefix',
+    'conflict_strategy': 'Skip',
+    'simulation_mode': False,
+    'filter_extension': '',
+    'apply_fix': False,
+    'include_subfolders': False,
+    'max_depth': 0,  # Subfolder levels to descend, 0 means no limit
+    'numbering_per_folder': False,
+    'stop_on_error': False,  # Fail fast instead of collecting every error of a batch
+    'sort_by': 'None',  # Order the files are numbered in: 'None' (scan order), 'Name', 'Modified' or 'Size'
+}
+
+DEFAULT_BATCH_SIZE = 1000
+# Directories scanned concurrently in recursive mode
+DEFAULT_SCAN_WORKERS = 8
+# Independent renames issued concurrently when committing a batch
+DEFAULT_RENAME_WORKERS = 8
+# Completed renames between two progress callbacks
+PROGRESS_INTERVAL = 500
+# Names sent to a plan process at a time, and the fewest names worth starting processes for
+PROCESS_CHUNK_SIZE = 20000
+MIN_PROCESS_NAMES = 50000
+
+
+def make_options(preset=None, **overrides):
+    """ Merge a (possibly partial) preset with the defaults. """
+    options = dict(DEFAULT_OPTIONS)
+    if preset:
+        options.update({k: v for k, v in preset.items() if k in DEFAULT_OPTIONS})
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+
+def load_options(preset_file):
+    """ Read a preset written by save_preset and return the full option set. """
+    with open(preset_file, 'r', encoding='utf-8') as f:
+        return make_options(json.load(f))
+
+
+# apply_fix patterns. A space is "free" unless it belongs to a ' - ' separator
+_NOT_FREE_SPACE = r'(?!(?! - )\s)'
+# ' - ' separators (plus a hyphen glued to one) and hyphens not next to a free space
+FIX_DASHES = re.compile(r' - (-' + _NOT_FREE_SPACE + r')?|(?<!\s)-' + _NOT_FREE_SPACE)
+# Characters other than letters, digits, whitespace and hyphens
+FIX_JUNK = re.compile(r'[^A-Za-z0-9\s\-]+')
+# lowercase-to-capital boundaries and whitespace runs, both become one space
+FIX_GAPS = re.compile(r'(?<=[a-z])(?=[A-Z])|\s{2,}')
+
+
+def _fix_dash(match):
+    if match.group(1):
+        return ' -  '  # The separator is kept, the hyphen after it becomes a space
+    return ' - ' if len(match.group()) == 3 else ' '
+
+
+def apply_fix(name):
+    """
+    Tidy a file name: hyphens that are not part of ' - ' become spaces, other
+    punctuation is dropped, camelCase words are split, whitespace is collapsed
+    and the result is Title Cased.
+    """
+    # Remove leading and trailing spaces
+    new_name = name.strip()
+
+    # Replace hyphens not surrounded by spaces with spaces, keeping ' - '
+    if '-' in new_name:
+        new_name = FIX_DASHES.sub(_fix_dash, new_name)
+
+    # Remove non-alphanumeric characters except spaces and hyphens, then split
+    # camelCase and collapse whitespace in one pass
+    new_name = FIX_GAPS.sub(' ', FIX_JUNK.sub('', new_name))
+
+    # Trim and convert to Title Case
+    return new_name.strip().title()
+
+
+# Case conversions by case_option; 'None' has no stage
+CASE_CONVERSIONS = {
+    'lowercase': str.lower,
+    'UPPERCASE': str.upper,
+    'Title Case': str.title,
+    'Sentence case': str.capitalize,
+}
+
+
+def _compile_pattern(replace_text, with_text):
+    """ Compile the replace pattern and check the replacement's group references. Raises re.error. """
+    pattern = re.compile(replace_text)
+    # The empty alternative matches any string with the same groups, so the
+    # replacement template is parsed here rather than on the first real match
+    try:
+        probe = re.compile(replace_text + '|')
+    except re.error:
+        probe = None
+    if probe is not None:
+        probe.sub(with_text, '', count=1)
+    return pattern
+
+
+# Metadata tokens allowed in the prefix and suffix, filled from the file's stat,
+# or its content digest for {hash} and {hash:N}
+METADATA_TOKEN = re.compile(r'\{(date|time|size|size_kb|mtime:[^{}]+|hash(?::\d+)?)\}')
+HASH_TOKEN = re.compile(r'\{hash(?::\d+)?\}')
+TOKEN_FORMATS = {'date': '%Y-%m-%d', 'time': '%H-%M-%S'}
+# Digest characters used by {hash}
+HASH_TOKEN_LENGTH = 8
+# Sort orders read from the stat, by the index of their field in a stat key
+SORT_FIELDS = {'Modified': 1, 'Size': 2}
+
+
+def format_token(stat, token):
+    """
+    Value of a metadata token (without braces) for an (inode, mtime, size) stat
+    key. Digests are not part of a stat key; StatCache.value fills in {hash}.
+    """
+    _, mtime, size = stat
+    if token.startswith('hash'):
+        return ''
+    if token == 'size':
+        return str(size)
+    if token == 'size_kb':
+        return str((size + 1023) // 1024)
+    time_format = TOKEN_FORMATS.get(token) or token[len('mtime:'):]
+    return time.strftime(time_format, time.localtime(mtime))
+
+
+def compile_template(text, stats=None):
+    """
+    Turn prefix or suffix text into render(stat) that fills in its metadata
+    tokens for one file, or None when text has none. Values come from the
+    StatCache stats when given. Tokens of a file without a stat are left empty.
+    """
+    parts = METADATA_TOKEN.split(text)  # Text, token, text, token, ..., text
+    if len(parts) == 1:
+        return None
+    value = stats.value if stats is not None else format_token
+    literal = ''.join(parts[::2])
+
+    def render(stat):
+        if stat is None:
+            return literal
+        return ''.join(part if i % 2 == 0 else value(stat, part) for i, part in enumerate(parts))
+
+    return render
+
+
+def uses_tokens(options):
+    return any(METADATA_TOKEN.search(options[key]) for key in ('prefix', 'suffix'))
+
+
+def uses_hash(options):
+    return any(HASH_TOKEN.search(options[key]) for key in ('prefix', 'suffix'))
+
+
+def needs_stats(options):
+    """ Whether options read file metadata, so a scan should collect it into a StatCache. """
+    return options['sort_by'] in SORT_FIELDS or uses_tokens(options)
+
+
+def _template_stage(render, skip_existing, at_start):
+    """ Prefix (at_start) or suffix stage whose text is rendered from every file's stat. """
+    def rename_one(name, stat):
+        text = render(stat)
+        if at_start:
+            return name if skip_existing and name.startswith(text) else text + name
+        return name if skip_existing and name.endswith(text) else name + text
+
+    return rename_one, lambda names, name_stats: list(map(rename_one, names, name_stats)), True
+
+
+def _rule_stages(options, stats=None):
+    """
+    The stages options ask for, in order, as (rename_one, rename_list, uses_stat)
+    triples of functions: one for a single name and one for a whole list of
+    names at once. Stages with uses_stat take the stat key of the file as a
+    second argument, or the list of them. Patterns are compiled and checked
+    here, raising re.error; stages that change nothing are left out.
+    """
+    stages = []
+
+    def mapped(function):
+        return function, lambda names: list(map(function, names)), False
+
+    # Apply fix first
+    if options['apply_fix']:
+        stages.append(mapped(apply_fix))
+
+    # Apply replace
+    replace_text = options['replace_text']
+    with_text = options['with_text']
+    if replace_text:
+        if options['use_regex']:
+            stages.append(mapped(partial(_compile_pattern(replace_text, with_text).sub, with_text)))
+        elif replace_text != with_text:
+            stages.append((lambda name: name.replace(replace_text, with_text),
+                           lambda names: [name.replace(replace_text, with_text) for name in names], False))
+
+    # Apply case conversion
+    case_conversion = CASE_CONVERSIONS.get(options['case_option'])
+    if case_conversion is not None:
+        stages.append(mapped(case_conversion))
+
+    # Apply prefix
+    prefix = options['prefix']
+    render = compile_template(prefix, stats)
+    if render is not None:
+        stages.append(_template_stage(render, options['skip_existing_prefix'], True))
+    elif prefix:
+        if options['skip_existing_prefix']:
+            stages.append((lambda name: name if name.startswith(prefix) else prefix + name,
+                           lambda names: [name if name.startswith(prefix) else prefix + name for name in names],
+                           False))
+        else:
+            stages.append((lambda name: prefix + name, lambda names: [prefix + name for name in names], False))
+
+    # Apply suffix
+    suffix = options['suffix']
+    render = compile_template(suffix, stats)
+    if render is not None:
+        stages.append(_template_stage(render, options['skip_existing_suffix'], False))
+    elif suffix:
+        if options['skip_existing_suffix']:
+            stages.append((lambda name: name if name.endswith(suffix) else name + suffix,
+                           lambda names: [name if name.endswith(suffix) else name + suffix for name in names],
+                           False))
+        else:
+            stages.append((lambda name: name + suffix, lambda names: [name + suffix for name in names], False))
+    return stages
+
+
+def compile_rules(options, stats=None):
+    """
+    Compile options into one rename(original_name, number) function, the fast
+    equivalent of get_new_name for a few names; see compile_batch for many.
+    Metadata tokens are filled from the StatCache stats, if given.
+    Raises re.error on a bad pattern.
+    """
+    stages = [(rename_one, uses_stat) for rename_one, _, uses_stat in _rule_stages(options, stats)]
+    hashing = stats is not None and uses_hash(options)
+    add_numbering = options['add_numbering']
+    numbering_padding = options['numbering_padding']
+    number_first = options['numbering_position'] == 'Prefix'
+
+    def rename(original_name, number):
+        # Only the last component of a relative path is renamed
+        directory, base_name = os.path.split(original_name)
+        new_name, ext = os.path.splitext(base_name)
+        stat = None
+        for stage, uses_stat in stages:
+            if uses_stat:
+                if stat is None and stats is not None:
+                    stat = stats.get(original_name)
+                    if hashing:
+                        stats.hash([original_name])
+                new_name = stage(new_name, stat)
+            else:
+                new_name = stage(new_name)
+
+        # Add numbering
+        if add_numbering:
+            number_str = str(number).zfill(numbering_padding)
+            new_name = number_str + new_name if number_first else new_name + number_str
+
+        # Remove space before extension
+        new_name = new_name.rstrip() + ext
+        return os.path.join(directory, new_name) if directory else new_name
+
+    return rename
+
+
+def _has_directory(name):
+    return os.sep in name or (os.altsep is not None and os.altsep in name)
+
+
+def _split_extensions(base_names):
+    """ os.path.splitext for a list of names without directories, as (stems, exts). """
+    stems = []
+    exts = []
+    for base_name, (stem, dot, ext) in zip(base_names, map(methodcaller('rpartition', '.'), base_names)):
+        if stem.strip('.'):  # Leading dots are part of the stem, not an extension
+            stems.append(stem)
+            exts.append(dot + ext)
+        else:
+            stems.append(base_name)
+            exts.append('')
+    return stems, exts
+
+
+def compile_batch(options, stats=None):
+    """
+    Compile options into rename_all(names, numbers) that renames a whole list at
+    once, one stage at a time over the list instead of one name at a time.
+    numbers holds the number of every name, see number_column; it is ignored
+    without numbering. Metadata tokens are filled from the stat keys in
+    name_stats, else from the StatCache stats. The result matches
+    compile_rules name for name. Raises re.error on a bad pattern.
+    """
+    stages = [(rename_list, uses_stat) for _, rename_list, uses_stat in _rule_stages(options, stats)]
+    uses_stats = any(uses_stat for _, uses_stat in stages)
+    hashing = stats is not None and uses_hash(options)
+    add_numbering = options['add_numbering']
+    numbering_padding = options['numbering_padding']
+    number_first = options['numbering_position'] == 'Prefix'
+
+    def rename_all(names, numbers=None, name_stats=None):
+        if uses_stats and name_stats is None:
+            name_stats = stats.lookup(names) if stats is not None else [None] * len(names)
+        if hashing:
+            stats.hash(names)  # All digests of the chunk at once, on the hashing pool
+
+        # Only the last component of a relative path is renamed
+        directories = None
+        if any(map(_has_directory, names)):
+            directories, names = zip(*map(os.path.split, names)) if names else ((), ())
+        stems, exts = _split_extensions(names)
+        for stage, uses_stat in stages:
+            stems = stage(stems, name_stats) if uses_stat else stage(stems)
+
+        # Add numbering
+        if add_numbering:
+            number_strs = map(str, numbers)
+            if numbering_padding > 1:
+                number_strs = [number_str.zfill(numbering_padding) for number_str in number_strs]
+            stems = list(map(add, number_strs, stems) if number_first else map(add, stems, number_strs))
+
+        # Remove space before extension
+        new_names = list(map(add, map(str.rstrip, stems), exts))
+        if directories is not None:
+            new_names = [os.path.join(directory, new_name) if directory else new_name
+                         for directory, new_name in zip(directories, new_names)]
+        return new_names
+
+    return rename_all
+
+
+def get_new_name(original_name, options, numbering_current):
+    """
+    Compute the new name of a single file. original_name may be a path relative
+    to the scanned folder; only its last component is renamed.
+    Raises re.error on a bad pattern. Use compile_rules for more than one name.
+    """
+    return compile_rules(options)(original_name, numbering_current)
+
+
+def _scan_directory(path, stats=None, relative_dir=''):
+    """
+    Read one directory. Returns (files, dirs, walk_dirs) where walk_dirs are the
+    subfolders to descend into: like os.walk, directory links are not followed.
+    With a StatCache the stat of every file is added to it under its name
+    relative to the scanned folder, relative_dir being the one of path.
+    """
+    files = []
+    dirs = []
+    walk_dirs = []
+    TRACE.count('scandir')
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+                if stats is not None:
+                    stats.add_entry(os.path.join(relative_dir, entry.name), entry)
+            else:
+                dirs.append(entry.name)
+                if not entry.is_symlink():
+                    walk_dirs.append(entry.name)
+    return files, dirs, walk_dirs
+
+
+def walk_parallel(folder, max_depth=0, workers=DEFAULT_SCAN_WORKERS, stats=None):
+    """
+    Yield (relative_dir, dir_names, file_names) for folder and its subfolders,
+    scanning up to `workers` directories at a time. Directories come out in
+    completion order. max_depth limits how many levels below folder are visited
+    (0 = no limit). Unreadable subfolders are skipped like os.walk does.
+    The stats of the files are added to the StatCache stats, if given.
+    """
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(_scan_directory, folder, stats): ('', 0)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative_dir, depth = pending.pop(future)
+                try:
+                    files, dirs, walk_dirs = future.result()
+                except OSError:
+                    if not relative_dir:
+                        raise
+                    continue
+                if not max_depth or depth < max_depth:
+                    for subdir in walk_dirs:
+                        child = os.path.join(relative_dir, subdir)
+                        future = pool.submit(_scan_directory, os.path.join(folder, child), stats, child)
+                        pending[future] = (child, depth + 1)
+                yield relative_dir, dirs, files
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_entry_names(folder, include_subfolders, max_depth, workers, index, stats):
+    if include_subfolders:
+        for relative_dir, dirnames, filenames in walk_parallel(folder, max_depth, workers, stats):
+            if index is not None:
+                index.update(os.path.join(relative_dir, name) for name in dirnames)
+            for filename in filenames:
+                yield os.path.join(relative_dir, filename)
+    else:
+        TRACE.count('scandir')
+        with os.scandir(folder) as it:
+            for entry in it:
+                if stats is not None:
+                    stats.add_entry(entry.name, entry)
+                yield entry.name
+
+
+def iter_scan(folder, filter_ext='', batch_size=DEFAULT_BATCH_SIZE, include_subfolders=False,
+              max_depth=0, workers=DEFAULT_SCAN_WORKERS, index=None, stats=None):
+    """
+    Yield the names in folder in batches while the directory is being read, so
+    large or remote folders start producing rows before the listing completes.
+    In recursive mode names are paths relative to folder and the files of one
+    directory are always yielded together.
+    If a NameIndex is given, every name seen is added to it, including the ones
+    excluded by filter_ext, so it can later be used for conflict checks.
+    With a StatCache, the stat of every entry is collected into it on the way,
+    from the directory listing where the platform provides it.
+    See compile_filter for what filter_ext accepts.
+    """
+    matches = compile_filter(filter_ext)
+    batch = []
+    for name in _iter_entry_names(folder, include_subfolders, max_depth, workers, index, stats):
+        if index is not None:
+            index.add(name)
+        if matches is None or matches(name):
+            batch.append(name)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def list_files(folder, filter_ext='', include_subfolders=False, max_depth=0, index=None, stats=None):
+    """ Names of the entries in folder, filtered by extension like the GUI list. """
+    return [name for batch in iter_scan(folder, filter_ext, include_subfolders=include_subfolders,
+                                        max_depth=max_depth, index=index, stats=stats)
+            for name in batch]
+
+
+def _is_glob(term):
+    return any(c in term for c in '*?[')
+
+
+def compile_filter(filter_ext):
+    """
+    Turn an extension filter into a match(name) function, or None when it lets
+    everything through. The filter holds one or more terms separated by commas,
+    semicolons or spaces: plain terms match the end of the name ('.jpg'), terms
+    with wildcards are glob patterns for the file name ('IMG_*.jp*g').
+    """
+    terms = [term for term in re.split(r'[,;\s]+', filter_ext) if term]
+    if not terms:
+        return None
+    suffixes = tuple(term for term in terms if not _is_glob(term))
+    globs = [term for term in terms if _is_glob(term)]
+    if not globs:
+        return lambda name: name.endswith(suffixes)
+    pattern = re.compile('|'.join(fnmatch.translate(term) for term in globs))
+
+    def matches(name):
+        return (bool(suffixes) and name.endswith(suffixes)) or pattern.match(os.path.basename(name)) is not None
+    return matches
+
+
+class StatCache:
+    """
+    Stat keys of the files of one folder by name, so each file is stat'ed at
+    most once: from the os.DirEntry during a scan, else with lstat on first
+    use. A key is (inode, mtime, size); the formatted token values are cached
+    by key, so they follow a file through renames and are only recomputed
+    after it changed. Shared by scan and preview threads.
+    """
+
+    def __init__(self, folder, hash_cache=None):
+        self.folder = folder
+        self.hash_cache = hash_cache  # hashcache.HashCache keeping digests across sessions, if any
+        self.stats = {}  # Name -> (inode, mtime, size), None for unreadable entries
+        self._values = {}  # (stat key, token) -> token value
+        self._digests = {}  # Stat key -> content digest
+
+    @staticmethod
+    def key(st):
+        return st.st_ino, st.st_mtime, st.st_size
+
+    def add_entry(self, name, entry):
+        """ Record the stat of a directory entry found by a scan. """
+        TRACE.count('stat')
+        try:
+            self.stats[name] = self.key(entry.stat(follow_symlinks=False))
+        except OSError:
+            self.stats[name] = None
+
+    def get(self, name):
+        """ The stat key of name, or None when it can't be read. """
+        try:
+            return self.stats[name]
+        except KeyError:
+            pass
+        TRACE.count('stat')
+        try:
+            stat = self.key(os.lstat(os.path.join(self.folder, name)))
+        except OSError:
+            stat = None
+        self.stats[name] = stat
+        return stat
+
+    def lookup(self, names):
+        return list(map(self.get, names))
+
+    def rename(self, pairs, digests=True):
+        """
+        Follow renames; pairs are (old_name, new_name). A rename keeps inode,
+        mtime and size. digests=False leaves the hash cache alone, for renames
+        it was already told about.
+        """
+        pairs = list(pairs)
+        moved = [(new_name, self.stats.pop(old_name)) for old_name, new_name in pairs if old_name in self.stats]
+        self.stats.update(moved)
+        if self.hash_cache is not None and digests:
+            self.hash_cache.rename((os.path.abspath(os.path.join(self.folder, old_name)),
+                                    os.path.abspath(os.path.join(self.folder, new_name)))
+                                   for old_name, new_name in pairs)
+
+    def discard(self, names):
+        for name in names:
+            self.stats.pop(name, None)
+
+    def hash(self, names):
+        """ Make sure the content digests of names are known, hashing the files not seen yet. Returns them. """
+        stats = self.lookup(names)
+        missing = [(name, stat) for name, stat in zip(names, stats)
+                   if stat is not None and stat not in self._digests]
+        if missing:
+            from hashcache import hash_files  # Loads hashlib, so only once something is hashed
+            digests = hash_files(self.folder, missing, self.hash_cache)
+            self._digests.update((stat, digests[name]) for name, stat in missing if name in digests)
+        return [None if stat is None else self._digests.get(stat) for stat in stats]
+
+    def value(self, stat, token):
+        """ format_token(stat, token), computed once per stat key; {hash} needs hash() first. """
+        try:
+            return self._values[stat, token]
+        except KeyError:
+            pass
+        if token.startswith('hash'):
+            digest = self._digests.get(stat)
+            if digest is None:
+                return ''  # Not hashed, or unreadable
+            value = digest[:int(token[len('hash:'):] or HASH_TOKEN_LENGTH)]
+        else:
+            value = format_token(stat, token)
+        self._values[stat, token] = value
+        return value
+
+
+def find_duplicates(names, stats):
+    """
+    Groups of names with identical contents, according to the StatCache stats.
+    Only files that share their size with another one are hashed. Returns a
+    list of (digest, size, names) with the names in their original order,
+    biggest waste first.
+    """
+    by_size = {}
+    for name, stat in zip(names, stats.lookup(names)):
+        if stat is not None:
+            by_size.setdefault(stat[2], []).append(name)
+    candidates = [name for group in by_size.values() if len(group) > 1 for name in group]
+    by_digest = {}
+    for name, digest in zip(candidates, stats.hash(candidates)):
+        if digest is not None:
+            by_digest.setdefault(digest, []).append(name)
+    groups = [(digest, stats.get(group[0])[2], group) for digest, group in by_digest.items() if len(group) > 1]
+    groups.sort(key=lambda group: group[1] * (len(group[2]) - 1), reverse=True)
+    return groups
+
+
+def sort_key(sort_by, stats=None):
+    """
+    key(name) ordering names by the sort_by option, or None for scan order.
+    'Modified' and 'Size' read the StatCache stats; unreadable files go last.
+    """
+    if sort_by == 'Name':
+        return lambda name: (name.lower(), name)
+    field = SORT_FIELDS.get(sort_by)
+    if field is None or stats is None:
+        return None
+
+    def key(name):
+        stat = stats.get(name)
+        return (True, 0, name) if stat is None else (False, stat[field], name)
+
+    return key
+
+
+class EntryStore:
+    """
+    The entries of a scanned folder in scan order, stored by column instead of
+    as one object per file: a list of names, a list of previews that share one
+    empty string, and compact arrays for the extension and flags. That is about
+    25 bytes per entry next to the name itself; stat data lives in a StatCache. Rows never move:
+    removed entries are only flagged, so row numbers held by a view stay valid.
+    Also lets the extension filter be changed without reading the disk again.
+    """
+    DELETED = 1
+
+    def __init__(self, names=()):
+        self.names = []
+        self.previews = []  # New name per entry, '' while there is none
+        self.ext_ids = array('I')  # Index into self.extensions
+        self.extensions = []
+        self._ext_ids = {}
+        self.flags = bytearray()
+        self.deleted = 0
+        self._rows = None  # Name -> row of the live entries, built when first needed
+        self.extend(names)
+
+    def __len__(self):
+        return len(self.names) - self.deleted
+
+    def __contains__(self, name):
+        return name in self._row_map()
+
+    def _row_map(self):
+        if self._rows is None:
+            self._rows = {name: row for row, name in enumerate(self.names) if not self.flags[row]}
+        return self._rows
+
+    def _ext_id(self, name):
+        ext = os.path.splitext(name)[1]
+        ext_id = self._ext_ids.get(ext)
+        if ext_id is None:
+            ext_id = self._ext_ids[ext] = len(self.extensions)
+            self.extensions.append(ext)
+        return ext_id
+
+    def extend(self, names):
+        """ Add entries; returns the range of their rows. """
+        start = len(self.names)
+        self.names.extend(names)
+        count = len(self.names) - start
+        self.previews.extend([''] * count)
+        self.ext_ids.extend(self._ext_id(name) for name in self.names[start:])
+        self.flags.extend(bytes(count))
+        if self._rows is not None:
+            self._rows.update((self.names[row], row) for row in range(start, len(self.names)))
+        return range(start, len(self.names))
+
+    def row(self, name):
+        """ Row of a live entry, or None. """
+        return self._row_map().get(name)
+
+    def set_name(self, row, name):
+        if self._rows is not None:
+            if self._rows.get(self.names[row]) == row:
+                del self._rows[self.names[row]]
+            self._rows[name] = row
+        self.names[row] = name
+        self.ext_ids[row] = self._ext_id(name)
+        self.previews[row] = ''
+
+    def rename(self, pairs):
+        """ Follow renames made outside a view; pairs are (old_name, new_name). Returns the rows changed. """
+        rows = []
+        for old_name, new_name in pairs:
+            row = self.row(old_name)
+            if row is not None:
+                self.set_name(row, new_name)
+                rows.append(row)
+        return rows
+
+    def remove(self, names):
+        """ Flag entries as gone from the folder. Returns their rows. """
+        rows = [row for row in map(self.row, names) if row is not None]
+        for row in rows:
+            del self._rows[self.names[row]]
+            self.names[row] = self.previews[row] = ''
+            self.flags[row] |= self.DELETED
+        self.deleted += len(rows)
+        return rows
+
+    def filter_rows(self, filter_ext):
+        """ Rows of the live entries accepted by compile_filter(filter_ext), in scan order. """
+        if compile_filter(filter_ext) is None:
+            return array('I', (row for row, flag in enumerate(self.flags) if not flag))
+
+        wanted = set()
+        suffixes = []
+        rest = []
+        for term in re.split(r'[,;\s]+', filter_ext):
+            if term.startswith('.') and term.count('.') == 1 and not _is_glob(term) and os.sep not in term:
+                # An extension; names made only of dots and it ('.jpg') have none
+                if term in self._ext_ids:
+                    wanted.add(self._ext_ids[term])
+                suffixes.append(term)
+            elif term:
+                rest.append(term)
+        no_ext = self._ext_ids.get('')
+        suffixes = tuple(suffixes)
+        matches = compile_filter(' '.join(rest))
+        names = self.names
+        return array('I', (
+            row for row, ext_id in enumerate(self.ext_ids)
+            if not self.flags[row] and (
+                ext_id in wanted
+                or (ext_id == no_ext and suffixes and names[row].endswith(suffixes))
+                or (matches is not None and matches(names[row])))))
+
+    def filter(self, filter_ext):
+        """ The live names accepted by compile_filter(filter_ext), in scan order. """
+        return [self.names[row] for row in self.filter_rows(filter_ext)]
+
+
+def _iter_numbers(names, options, selected_rows=None):
+    """
+    Yield (row, name, number) for names, where number is the numbering value the
+    row gets, or None for rows outside selected_rows. Every included row consumes
+    a number; with numbering_per_folder every folder counts on its own, so the
+    rows of a folder need not be next to each other (sorted lists, files added
+    by the watcher at the end).
+    """
+    add_numbering = options['add_numbering']
+    numbering_increment = options['numbering_increment']
+    numbering_start = options['numbering_start']
+    numbering_counter = numbering_start
+    numbering_per_folder = add_numbering and options['numbering_per_folder']
+    next_numbers = {}  # Directory -> its next number, with numbering_per_folder
+
+    for i, original_name in enumerate(names):
+        if selected_rows is not None and i not in selected_rows:
+            yield i, original_name, None
+            continue
+        if numbering_per_folder:
+            directory = os.path.dirname(original_name)
+            number = next_numbers.get(directory, numbering_start)
+            next_numbers[directory] = number + numbering_increment
+            yield i, original_name, number
+            continue
+        yield i, original_name, numbering_counter
+        if add_numbering:
+            numbering_counter += numbering_increment
+
+
+def number_column(names, options, selected_rows=None):
+    """
+    The numbering value of every name as a list, None for rows outside
+    selected_rows, or None as a whole when numbering is off. Without a selection
+    or per-folder numbering this is one range instead of a running counter.
+    """
+    if not options['add_numbering']:
+        return None
+    start = options['numbering_start']
+    increment = options['numbering_increment']
+    if selected_rows is None and not options['numbering_per_folder']:
+        if not increment:
+            return [start] * len(names)
+        return range(start, start + increment * len(names), increment)
+    return [number for _, _, number in _iter_numbers(names, options, selected_rows)]
+
+
+# The rename_all of a plan process, compiled once by _init_plan_process
+_process_rename_all = None
+
+
+def _init_plan_process(options):
+    global _process_rename_all
+    _process_rename_all = compile_batch(options)
+
+
+def _rename_in_process(names, numbers, name_stats):
+    return _process_rename_all(names, numbers, name_stats)
+
+
+def _iter_renamed(names, options, chunk_size, processes, stats=None):
+    """
+    Yield (names_chunk, new_names) in order. With processes > 1 the chunks are
+    renamed by that many processes (0 = one per core), each compiling the
+    options once; numbers and stat keys are handed out here, so numbering runs
+    on across chunks and the stat cache stays in this process.
+    """
+    rename_all = compile_batch(options, stats)  # Raises re.error before any process starts
+    numbers = number_column(names, options)
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1 or len(names) < MIN_PROCESS_NAMES or uses_hash(options):
+        # Digests come from this process's stat cache, and hashing runs on threads anyway
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            yield chunk, rename_all(chunk, numbers and numbers[start:start + chunk_size])
+        return
+
+    # Loads multiprocessing, a good part of the import time of this module otherwise
+    from concurrent.futures import ProcessPoolExecutor
+    chunk_size = max(chunk_size, PROCESS_CHUNK_SIZE)
+    tokens = uses_tokens(options)
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_plan_process, initargs=(options,))
+    try:
+        pending = deque()
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            name_stats = stats.lookup(chunk) if tokens and stats is not None else None
+            pending.append((chunk, pool.submit(_rename_in_process, chunk,
+                                               numbers and numbers[start:start + chunk_size], name_stats)))
+            if len(pending) >= 2 * processes:  # Bound the results waiting to be yielded
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_plan(names, options, batch_size=DEFAULT_BATCH_SIZE, processes=1, stats=None):
+    """
+    Yield the rename plan for names as batches of (old_name, new_name) pairs.
+    Unchanged names are left out but still consume a number, like the preview.
+    With processes other than 1 large lists are renamed in a process pool,
+    see _iter_renamed, which pays off for regex and fix heavy rules.
+    Metadata tokens are filled from the StatCache stats.
+    """
+    batch = []
+    for chunk, new_names in _iter_renamed(names, options, batch_size, processes, stats):
+        batch.extend((original_name, new_name) for original_name, new_name in zip(chunk, new_names)
+                     if new_name != original_name)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def _chunk_previews(rename_all, names, numbers, selected):
+    """ Previews of one chunk of names; selected tells which of them are renamed, None for all. """
+    if selected is not None:
+        picked = [i for i, is_selected in enumerate(selected) if is_selected]
+        new_names = rename_all([names[i] for i in picked], numbers and [numbers[i] for i in picked])
+        previews = [''] * len(names)
+        for i, new_name in zip(picked, new_names):
+            previews[i] = new_name if new_name != names[i] else ''
+        return previews
+    return [new_name if new_name != original_name else ''
+            for original_name, new_name in zip(names, rename_all(names, numbers))]
+
+
+def iter_previews(names, options, selected_rows=None, chunk_size=DEFAULT_BATCH_SIZE, stats=None):
+    """
+    Yield (start_row, previews) chunks for the GUI preview column. A preview is the
+    new name, or '' when the row is unchanged or outside selected_rows.
+    Metadata tokens are filled from the StatCache stats.
+    """
+    rename_all = compile_batch(options, stats)
+    numbers = number_column(names, options, selected_rows)
+    for start in range(0, len(names), chunk_size):
+        end = min(start + chunk_size, len(names))
+        selected = None if selected_rows is None else [row in selected_rows for row in range(start, end)]
+        yield start, _chunk_previews(rename_all, names[start:end], numbers and numbers[start:end], selected)
+
+
+def numbers_depend_on_names(options, selected_rows=None):
+    """ Whether a row's number depends on the rows above it (a selection, folders), not only on its position. """
+    return bool(options['add_numbering']) and (selected_rows is not None or bool(options['numbering_per_folder']))
+
+
+def preview_rows(names, rows, options, selected_rows=None, stats=None):
+    """
+    Previews for just the given rows, numbered as in a full iter_previews pass.
+    names is indexed by row: the names of all rows, or only a {row: name} dict
+    of these rows unless numbers_depend_on_names. Returns {row: preview}.
+    """
+    rows = list(rows)
+    if numbers_depend_on_names(options, selected_rows):
+        column = number_column(names, options, selected_rows)
+        numbers = [column[row] for row in rows]
+    else:
+        # The number only depends on the row position
+        numbers = [options['numbering_start'] + options['numbering_increment'] * row for row in rows]
+    selected = None if selected_rows is None else [row in selected_rows for row in rows]
+    previews = _chunk_previews(compile_batch(options, stats), [names[row] for row in rows], numbers, selected)
+    return dict(zip(rows, previews))
+
+
+class NameCollisionError(FileExistsError):
+    """ Two files of the same batch were planned onto the same name. """
+
+
+class NameIndex:
+    """
+    The names present in a scanned folder (relative paths in recursive mode),
+    kept up to date while a batch is planned. Conflict checks and '_N' suffixes
+    are resolved against it in memory instead of probing the disk per file.
+    """
+
+    def __init__(self, names=()):
+        self._names = {os.path.normcase(name) for name in names}
+        self._planned = set()  # Targets claimed by the batch being planned
+        self._next_suffix = {}  # (base, ext) -> first '_N' counter worth trying
+
+    @classmethod
+    def from_folder(cls, folder, include_subfolders=False, max_depth=0):
+        index = cls()
+        for _ in iter_scan(folder, include_subfolders=include_subfolders, max_depth=max_depth, index=index):
+            pass
+        return index
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return os.path.normcase(name) in self._names
+
+    def copy(self):
+        """ An independent index of the same names, e.g. to plan a dry run without touching this one. """
+        index = NameIndex()
+        index._names = set(self._names)
+        return index
+
+    def add(self, name):
+        self._names.add(os.path.normcase(name))
+
+    def update(self, names):
+        self._names.update(os.path.normcase(name) for name in names)
+
+    def discard(self, name):
+        self._names.discard(os.path.normcase(name))
+
+    def move(self, old_name, new_name):
+        self.discard(old_name)
+        self.add(new_name)
+
+    def new_batch(self):
+        """ Forget which targets were claimed; call before planning the next batch. """
+        self._planned.clear()
+
+    def _unique_name(self, new_name):
+        base, ext = os.path.splitext(new_name)
+        counter = self._next_suffix.get((base, ext), 1)
+        candidate = f"{base}_{counter}{ext}"
+        while candidate in self:
+            counter += 1
+            candidate = f"{base}_{counter}{ext}"
+        self._next_suffix[(base, ext)] = counter + 1
+        return candidate
+
+    def resolve(self, old_name, new_name, conflict_strategy):
+        """
+        Decide where old_name goes and claim the target in the index; the
+        sources of the batch were already taken out by plan_batch, so a name
+        claimed by an earlier move is never freed again here.
+        Returns the name to rename to, or None when the file should be skipped.
+        Raises NameCollisionError under 'Overwrite' when the target was already
+        claimed by another file of this batch, since that would lose data.
+        """
+        if os.path.normcase(old_name) != os.path.normcase(new_name) and new_name in self:
+            if conflict_strategy == 'Skip':
+                return None
+            elif conflict_strategy == 'Rename':
+                new_name = self._unique_name(new_name)
+            elif os.path.normcase(new_name) in self._planned:
+                raise NameCollisionError(f'{new_name} is also the target of another file in this batch')
+        self.add(new_name)
+        self._planned.add(os.path.normcase(new_name))
+        return new_name
+
+    def temporary_name(self, name):
+        """ Reserve an unused name next to name, used to break rename cycles. """
+        for candidate in _temporary_names(name):
+            if candidate not in self:
+                self.add(candidate)
+                return candidate
+
+
+def _temporary_names(name):
+    """ The names a file may be parked under to break a cycle, in the order they are tried. """
+    directory, base = os.path.split(name)
+    yield os.path.join(directory, f'.{base}.renamer-tmp')
+    counter = 1
+    while True:
+        yield os.path.join(directory, f'.{base}.renamer-tmp{counter}')
+        counter += 1
+
+
+def plan_batch(batch, index, conflict_strategy='Skip'):
+    """
+    Phase one of a commit: resolve the target of every (old_name, new_name) pair
+    against index. The batch's own sources count as vacated, so swaps and chains
+    (file_001 -> file_002 -> file_003) are not mistaken for conflicts. When a file
+    has to stay where it is after all, moves planned onto its name are resolved
+    again. Returns (moves, errors): moves holds (old_name, new_name, overwrites)
+    in batch order, errors holds (old_name, exception) pairs.
+    """
+    index.new_batch()
+    for old_name, _ in batch:
+        index.discard(old_name)
+
+    resolved = {}  # batch position -> (new_name, overwrites)
+    claimed = {}  # target key -> batch position
+    failed = {}  # batch position -> exception
+    pending = deque(range(len(batch)))
+    while pending:
+        i = pending.popleft()
+        old_name, planned_name = batch[i]
+        target_existed = planned_name in index
+        try:
+            new_name = index.resolve(old_name, planned_name, conflict_strategy)
+        except NameCollisionError as e:
+            failed[i] = e
+            new_name = None
+        if new_name is not None:
+            resolved[i] = (new_name, target_existed and new_name == planned_name)
+            claimed[os.path.normcase(new_name)] = i
+            continue
+        # The file stays, so a move planned onto its name has to be resolved again.
+        # Its claim is kept, which turns 'Overwrite' into a collision for it.
+        index.add(old_name)
+        j = claimed.pop(os.path.normcase(old_name), None)
+        if j is not None:
+            del resolved[j]
+            pending.append(j)
+
+    moves = [(batch[i][0],) + resolved[i] for i in sorted(resolved)]
+    errors = [(batch[i][0], failed[i]) for i in sorted(failed)]
+    return moves, errors
+
+
+def order_moves(moves, index):
+    """
+    Group resolved moves into chains whose steps must run in order, so that
+    every target is vacated before it is used. A move's target is the source of
+    at most one other move, so the batch splits into chains and cycles: chains
+    run from their free end, cycles are broken by parking one file under a
+    temporary name. Different chains never touch the same names and can run
+    concurrently. Each chain is a list of (src, dst, move) steps, where move is
+    the entry of moves the step belongs to.
+    """
+    by_source = {os.path.normcase(move[0]): i for i, move in enumerate(moves)}
+    unblocks = {}  # i -> the move waiting for move i to vacate its source
+    blocked = set()
+    for i, (old_name, new_name, _) in enumerate(moves):
+        j = by_source.get(os.path.normcase(new_name))
+        if j is not None and j != i:
+            unblocks[j] = i
+            blocked.add(i)
+
+    chains = []
+    done = [False] * len(moves)
+
+    def follow(k, steps, stop=None):
+        while k is not None and k != stop and not done[k]:
+            done[k] = True
+            steps.append((moves[k][0], moves[k][1], moves[k]))
+            k = unblocks.get(k)
+        return steps
+
+    for i in range(len(moves)):
+        if i not in blocked:
+            chains.append(follow(i, []))
+
+    # Whatever is left belongs to a cycle
+    for i in range(len(moves)):
+        if done[i]:
+            continue
+        old_name, new_name, _ = moves[i]
+        temp_name = index.temporary_name(old_name)
+        done[i] = True
+        steps = follow(unblocks.get(i), [(old_name, temp_name, moves[i])], stop=i)
+        steps.append((temp_name, new_name, moves[i]))
+        chains.append(steps)
+    return chains
+
+
+class DirectoryRenamer:
+    """
+    Renames entries below folder through cached directory descriptors, so each
+    call only resolves the last path component. Falls back to full paths on
+    platforms where os.rename doesn't support dir_fd.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.use_dir_fd = os.rename in os.supports_dir_fd
+        self._dir_fds = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _dir_fd(self, directory):
+        fd = self._dir_fds.get(directory)
+        if fd is None:
+            with self._lock:
+                fd = self._dir_fds.get(directory)
+                if fd is None:
+                    path = os.path.join(self.folder, directory) if directory else self.folder
+                    TRACE.count('open')
+                    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+                    self._dir_fds[directory] = fd
+        return fd
+
+    def rename(self, src, dst):
+        TRACE.count('rename')
+        if not self.use_dir_fd:
+            os.rename(os.path.join(self.folder, src), os.path.join(self.folder, dst))
+            return
+        src_dir, src_base = os.path.split(src)
+        dst_dir, dst_base = os.path.split(dst)
+        os.rename(src_base, dst_base, src_dir_fd=self._dir_fd(src_dir), dst_dir_fd=self._dir_fd(dst_dir))
+
+    def close(self):
+        for fd in self._dir_fds.values():
+            os.close(fd)
+        self._dir_fds.clear()
+
+
+def _release_steps(index, steps):
+    """
+    Put the index back in line with the disk for chain steps that never ran:
+    the targets of their moves are free again, unless they overwrite a file,
+    and every file keeps the name it is still at, its old name or the
+    temporary name a cycle parked it under.
+    """
+    remaining = {}  # Old name -> the first step of the move that did not run
+    for step in steps:
+        remaining.setdefault(step[2][0], step)
+    for src, dst, (_, new_name, overwrites) in remaining.values():
+        if not overwrites:
+            index.discard(new_name)
+        if dst != new_name:
+            index.discard(dst)  # The temporary name was never used
+    # After the discards, since a target in a chain is the source of the next move
+    for src, _, _ in remaining.values():
+        index.add(src)
+
+
+def _run_chain(renamer, folder, chain, index, stop, journal=None, first_step=0):
+    """ Run the steps of one chain in order. Returns (history, errors) like commit_batch. """
+    history = []
+    errors = []
+    for position, (src, dst, (old_name, new_name, overwrites)) in enumerate(chain):
+        if stop.is_set():
+            _release_steps(index, chain[position:])
+            break
+        try:
+            renamer.rename(src, dst)
+            if journal is not None:
+                journal.step_done(first_step + position)
+        except OSError as e:
+            if src != old_name:
+                e = OSError(f'{e}; the file was left as {src}')
+            errors.append((old_name, e))
+            # Later steps target a name this one was supposed to free
+            for _, _, (blocked_name, _, _) in chain[position + 1:]:
+                if blocked_name != old_name:
+                    errors.append((blocked_name, NameCollisionError(f'{src} could not be moved out of the way')))
+            _release_steps(index, chain[position:])
+            break
+        if dst == new_name:
+            if src != old_name:
+                index.discard(src)  # Temporary name is free again
+            history.append((os.path.join(folder, old_name), os.path.join(folder, new_name)))
+    return history, errors
+
+
+def commit_batch(folder, batch, index, conflict_strategy='Skip', simulation_mode=False,
+                 workers=DEFAULT_RENAME_WORKERS, stop_on_error=False, progress=None, journal=None):
+    """
+    Rename one batch inside folder in two phases: plan every target against
+    index first, then run the renames in dependency order. Independent chains
+    are renamed concurrently by up to `workers` threads, which pays off on
+    network shares where every rename is a round trip.
+    With stop_on_error no new renames are started after the first failure;
+    otherwise every error is collected. progress, if given, is called from the
+    calling thread as progress(done, total) every PROGRESS_INTERVAL renames.
+    With a journal.RenameJournal the planned steps are logged before the first
+    rename and every completed step after it, for crash recovery and undo.
+    Returns (history, errors): history holds (old_path, new_path) pairs that were
+    applied, errors holds (old_name, exception) pairs.
+    """
+    with TRACE.phase('plan') as phase:
+        moves, errors = plan_batch(batch, index, conflict_strategy)
+        phase.add(len(batch))
+    if simulation_mode:
+        history = [(os.path.join(folder, old_name), os.path.join(folder, new_name))
+                   for old_name, new_name, _ in moves]
+        return history, errors
+    if errors and stop_on_error:
+        return [], errors
+
+    history = []
+    total = len(moves)
+    reported = 0
+    stop = threading.Event()
+    with DirectoryRenamer(folder) as renamer, TRACE.phase('rename') as phase:
+        chains = order_moves(moves, index)
+        batch_id = journal.begin(folder, chains) if journal is not None and chains else None
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        finished = False
+        try:
+            futures = []
+            first_step = 0
+            for chain in chains:
+                futures.append(pool.submit(_run_chain, renamer, folder, chain, index, stop, journal, first_step))
+                first_step += len(chain)
+            for future in futures:
+                chain_history, chain_errors = future.result()
+                history.extend(chain_history)
+                errors.extend(chain_errors)
+                if chain_errors and stop_on_error:
+                    stop.set()
+                if progress is not None and len(history) - reported >= PROGRESS_INTERVAL:
+                    reported = len(history)
+                    progress(reported, total)
+            finished = True
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            # A batch cut short by an exception stays open, for recover() to replay or roll back
+            if batch_id is not None and finished:
+                journal.end(batch_id, 'committed')
+            phase.add(len(history))
+    if progress is not None and len(history) != reported:
+        progress(len(history), total)
+    return history, errors
+
+
+def format_errors(errors, limit=10):
+    """ One line per failure, truncated after limit entries, for a final report. """
+    lines = [f'{name}: {e}' for name, e in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f'... and {len(errors) - limit} more')
+    return '\n'.join(lines)
+
+
+def _undo_index(folder, batch):
+    """
+    A NameIndex of only the names undoing batch can run into, each checked on
+    disk, instead of a listing of the whole folder: the current names, the
+    names they go back to and the temporary names a cycle may take.
+    """
+    index = NameIndex(current_name for current_name, _ in batch)
+    for current_name, restored_name in batch:
+        if os.path.lexists(os.path.join(folder, restored_name)):
+            index.add(restored_name)
+        for candidate in _temporary_names(current_name):
+            if not os.path.lexists(os.path.join(folder, candidate)):
+                break
+            index.add(candidate)
+    return index
+
+
+def revert_history(history):
+    """
+    Rename (old_path, new_path) pairs back to their old paths with the same
+    cycle-safe planner, never overwriting a file. Only the names involved are
+    checked on disk, the folders are not listed. Returns (reverted, errors)
+    where reverted holds the (old_path, new_path) pairs that were undone.
+    """
+    by_folder = {}
+    for old_path, new_path in history:
+        by_folder.setdefault(os.path.dirname(new_path), []).append((old_path, new_path))
+
+    reverted = []
+    errors = []
+    for folder, pairs in by_folder.items():
+        batch = [(os.path.basename(new_path), os.path.basename(old_path)) for old_path, new_path in pairs]
+        done, failed = commit_batch(folder, batch, _undo_index(folder, batch), 'Skip')
+        reverted.extend((old_path, new_path) for new_path, old_path in done)
+        errors.extend((os.path.join(folder, name), e) for name, e in failed)
+        # Moves dropped by the 'Skip' strategy: something already took the old name
+        handled = {new_path for new_path, _ in done}
+        handled.update(os.path.join(folder, name) for name, _ in failed)
+        errors.extend((new_path, FileExistsError(f'{old_path} already exists'))
+                      for old_path, new_path in pairs if new_path not in handled)
+    return reverted, errors
+
+
+def rename_names(folder, names, index, options, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_RENAME_WORKERS,
+                 journal=None, processes=1, stats=None):
+    """
+    Plan and commit names already listed from folder, with index holding every
+    name in it, yielding (history, errors) per batch: rename_folder without
+    the scan. stats is the StatCache of folder when the options need one.
+    """
+    key = sort_key(options['sort_by'], stats)
+    if key is not None:
+        names = sorted(names, key=key)
+    hash_cache = stats.hash_cache if stats is not None else None
+    plan = iter_plan(names, options, batch_size, processes, stats)
+    while True:
+        with TRACE.phase('transform') as phase:
+            batch = next(plan, None)
+            phase.add(len(batch or ()))
+        if batch is None:
+            return
+        history, errors = commit_batch(folder, batch, index, options['conflict_strategy'],
+                                       options['simulation_mode'], workers, options['stop_on_error'],
+                                       journal=journal)
+        if hash_cache is not None and not options['simulation_mode']:
+            # Only the digests move along; the plan keeps reading the stats by the names it started with
+            hash_cache.rename((os.path.abspath(old_path), os.path.abspath(new_path)) for old_path, new_path in history)
+        yield history, errors
+        if errors and options['stop_on_error']:
+            return
+
+
+def rename_folder(folder, options, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_RENAME_WORKERS, journal=None,
+                  processes=1, hash_cache=None):
+    """
+    Plan and commit a whole folder, yielding (history, errors) per batch.
+    With the stop_on_error option no further batch is started after a failure.
+    processes is passed on to iter_plan. A hashcache.HashCache keeps the
+    digests of {hash} tokens across runs.
+    """
+    names, index, stats = scan_folder(folder, options, hash_cache)
+    yield from rename_names(folder, names, index, options, batch_size, workers, journal, processes, stats)
+
+
+def scan_folder(folder, options, hash_cache=None):
+    """
+    List folder for a rename with options. Returns (names, index, stats): the
+    names passing the extension filter, the NameIndex of every name in folder
+    and its StatCache, None unless the options need one.
+    """
+    index = NameIndex()
+    stats = StatCache(folder, hash_cache) if needs_stats(options) else None
+    with TRACE.phase('scan') as phase:
+        names = list_files(folder, options['filter_extension'], options['include_subfolders'],
+                           options['max_depth'], index, stats)
+        phase.add(len(names))
+    return names, index, stats
@@ -0,0 +1,1505 @@
+import sys
+import os
+import re
+import json
+from array import array
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QPushButton, QLabel, QLineEdit, QFileDialog,
+    QVBoxLayout, QHBoxLayout, QMessageBox, QCheckBox, QComboBox, QSpinBox,
+    QTableView, QHeaderView, QAbstractItemView, QProgressBar, QStatusBar,
+    QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem
+)
+from PyQt6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QThread, QTimer, pyqtSignal, QItemSelection, QItemSelectionModel
+)
+
+import engine
+import planfile
+from journal import RenameJournal
+from instrumentation import TRACE
+from settings import JOURNAL_FILE, HASH_CACHE_FILE
+
+# Preview passes are coalesced for this long after the last option change
+PREVIEW_DEBOUNCE_MS = 150
+# Number of rows computed by the preview worker between two updates of the view
+PREVIEW_CHUNK_SIZE = 2000
+# Number of directory entries the scanner hands to the list at a time
+SCAN_BATCH_SIZE = 5000
+# Longest wait of the folder watcher between two checks for cancellation, in seconds
+WATCH_TIMEOUT = 0.5
+
+
+class FileListModel(QAbstractTableModel):
+    """
+    Original/Preview table over an engine.EntryStore. The model only holds the
+    store rows that pass the filter, so nothing is copied per file and only
+    visible rows are drawn.
+    """
+    ORIGINAL_COLUMN = 0
+    PREVIEW_COLUMN = 1
+    HEADERS = ('Original', 'Preview')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = engine.EntryStore()
+        self.rows = array('I')  # Store row shown in every table row
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        if index.column() == self.ORIGINAL_COLUMN:
+            return self.store.names[self.rows[index.row()]]
+        return self.store.previews[self.rows[index.row()]]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation != Qt.Orientation.Horizontal:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        if role == Qt.ItemDataRole.FontRole:
+            font = QApplication.font()
+            font.setBold(True)
+            return font
+        return None
+
+    def set_store(self, store):
+        """ Show a new, empty scan; its rows are added with append_rows. """
+        self.beginResetModel()
+        self.store = store
+        self.rows = array('I')
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """ Show these store rows instead, e.g. after the filter changed. """
+        self.beginResetModel()
+        self.rows = array('I', rows)
+        previews = self.store.previews
+        for row in self.rows:
+            previews[row] = ''  # Left over from a pass over another selection of rows
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def insert_rows(self, position, rows):
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        self.rows[position:position] = array('I', rows)
+        self.endInsertRows()
+
+    def insert_position(self, key, value):
+        """ Table row where a store row whose key(name) is value goes, after its equals as in a stable sort. """
+        names = self.store.names
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            if value < key(names[self.rows[middle]]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def remove_rows(self, rows):
+        """ Remove table rows, with one notification per contiguous run. """
+        rows = sorted(rows, reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            self.endRemoveRows()
+
+    def table_rows(self, store_rows):
+        """ The table rows showing any of store_rows. """
+        store_rows = set(store_rows)
+        return [row for row, store_row in enumerate(self.rows) if store_row in store_rows]
+
+    def names(self):
+        """ The original names of all table rows, for a preview or rename pass. """
+        names = self.store.names
+        return [names[row] for row in self.rows]
+
+    def original_name(self, row):
+        return self.store.names[self.rows[row]]
+
+    def preview_name(self, row):
+        return self.store.previews[self.rows[row]]
+
+    def set_previews(self, previews):
+        """ Replace the whole preview column with a single change notification. """
+        store_previews = self.store.previews
+        for row, preview in zip(self.rows, previews):
+            store_previews[row] = preview
+        if previews:
+            self.dataChanged.emit(self.index(0, self.PREVIEW_COLUMN),
+                                  self.index(len(previews) - 1, self.PREVIEW_COLUMN))
+
+    def set_preview_range(self, start, previews):
+        """ Replace a contiguous block of previews, as streamed by PreviewWorker. """
+        end = start + len(previews)
+        store_previews = self.store.previews
+        for row, preview in zip(self.rows[start:end], previews):
+            store_previews[row] = preview
+        self.dataChanged.emit(self.index(start, self.PREVIEW_COLUMN), self.index(end - 1, self.PREVIEW_COLUMN))
+
+    def update_rows(self, updates):
+        """ Apply {row: (original, preview)} with a single change notification. """
+        if not updates:
+            return
+        for row, (original, preview) in updates.items():
+            store_row = self.rows[row]
+            if original != self.store.names[store_row]:
+                self.store.set_name(store_row, original)
+            self.store.previews[store_row] = preview
+        self.dataChanged.emit(self.index(min(updates), self.ORIGINAL_COLUMN),
+                              self.index(max(updates), self.PREVIEW_COLUMN))
+
+    def rows_changed(self, rows):
+        """ Tell the view that the store changed under these table rows. """
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), self.ORIGINAL_COLUMN),
+                                  self.index(max(rows), self.PREVIEW_COLUMN))
+
+    def update_original_name(self, row, text):
+        self.store.set_name(self.rows[row], text)
+        self.dataChanged.emit(self.index(row, self.ORIGINAL_COLUMN), self.index(row, self.PREVIEW_COLUMN))
+
+
+class PreviewWorker(QThread):
+    """ Computes one preview pass off the GUI thread and streams the rows back in chunks. """
+    chunk_ready = pyqtSignal(int, int, list)  # generation, start row, previews
+    failed = pyqtSignal(int, str)  # generation, error message
+
+    def __init__(self, generation, names, options, selected_rows, stats, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.names = names
+        self.options = options
+        self.selected_rows = selected_rows
+        self.stats = stats
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            with TRACE.phase('preview') as phase:
+                for start, previews in engine.iter_previews(
+                        self.names, self.options, self.selected_rows, PREVIEW_CHUNK_SIZE, self.stats):
+                    if self._cancelled:
+                        return
+                    phase.add(len(previews))
+                    self.chunk_ready.emit(self.generation, start, previews)
+        except re.error as e:
+            if not self._cancelled:
+                self.failed.emit(self.generation, str(e))
+
+
+class ScanWorker(QThread):
+    """ Reads a folder off the GUI thread and streams the names back in batches. """
+    batch_ready = pyqtSignal(int, list)  # generation, names
+    failed = pyqtSignal(int, str)  # generation, error message
+
+    def __init__(self, generation, folder, include_subfolders, max_depth, index, stats=None, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.index = index
+        self.stats = stats
+        self.folder = folder
+        self.include_subfolders = include_subfolders
+        self.max_depth = max_depth
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            with TRACE.phase('scan') as phase:
+                for names in engine.iter_scan(self.folder, '', SCAN_BATCH_SIZE,
+                                              self.include_subfolders, self.max_depth, index=self.index,
+                                              stats=self.stats):
+                    if self._cancelled:
+                        return
+                    phase.add(len(names))
+                    self.batch_ready.emit(self.generation, names)
+        except OSError as e:
+            if not self._cancelled:
+                self.failed.emit(self.generation, str(e))
+
+
+class WatchWorker(QThread):
+    """ Follows changes to the loaded folder and sends them to the list in batches. """
+    changes_ready = pyqtSignal(int, list)  # generation, [(kind, name, new_name)]
+
+    def __init__(self, generation, folder, include_subfolders, max_depth, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.folder = folder
+        self.include_subfolders = include_subfolders
+        self.max_depth = max_depth
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        from watcher import open_watcher  # Loads ctypes, which the first window can do without
+        try:
+            watcher = open_watcher(self.folder, self.include_subfolders, self.max_depth)
+        except OSError:
+            return  # The scan reports an unreadable folder
+        try:
+            while not self._cancelled:
+                changes = watcher.read(WATCH_TIMEOUT)
+                if changes and not self._cancelled:
+                    self.changes_ready.emit(self.generation, changes)
+        finally:
+            watcher.close()
+
+
+class DuplicatesWorker(QThread):
+    """ Groups the listed files by content off the GUI thread. """
+    found = pyqtSignal(list)  # [(digest, size, names)]
+
+    def __init__(self, names, stats, parent=None):
+        super().__init__(parent)
+        self.names = names
+        self.stats = stats
+
+    def run(self):
+        self.found.emit(engine.find_duplicates(self.names, self.stats))
+
+
+class PlanExportWorker(QThread):
+    """ Plans a batch against a copy of the folder's index and streams the decisions to a plan file. """
+    exported = pyqtSignal(dict)  # Records per action
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, folder, batch, index, options, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.folder = folder
+        self.batch = batch
+        self.index = index
+        self.options = options
+
+    def run(self):
+        try:
+            with planfile.PlanWriter(self.path, self.folder, self.options) as writer:
+                for start in range(0, len(self.batch), engine.DEFAULT_BATCH_SIZE):
+                    chunk = self.batch[start:start + engine.DEFAULT_BATCH_SIZE]
+                    moves, errors = engine.plan_batch(chunk, self.index, self.options['conflict_strategy'])
+                    writer.write(planfile.plan_records(chunk, moves, errors))
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        self.exported.emit(writer.counts)
+
+
+class DuplicatesDialog(QDialog):
+    """ Lists groups of identical files; Select in List selects every copy but the first of each group. """
+
+    def __init__(self, groups, parent=None):
+        super().__init__(parent)
+        self.groups = groups
+        self.setWindowTitle('Duplicates')
+        self.resize(700, 500)
+
+        wasted = sum(size * (len(names) - 1) for _, size, names in groups)
+        summary_label = QLabel(f'{len(groups):,} group(s) of identical files, {wasted:,} bytes in extra copies.')
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(['File', 'Size'])
+        self.tree.setColumnWidth(0, 500)
+        for digest, size, names in groups:
+            group_item = QTreeWidgetItem([f'{len(names)} copies ({digest[:16]})', f'{size:,}'])
+            group_item.addChildren([QTreeWidgetItem([name, '']) for name in names])
+            self.tree.addTopLevelItem(group_item)
+        self.tree.expandAll()
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        self.select_button = buttons.addButton('Select in List', QDialogButtonBox.ButtonRole.AcceptRole)
+        self.select_button.setToolTip('Select every copy except the first of each group, e.g. to rename them.')
+        self.select_button.setEnabled(bool(groups))
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(summary_label)
+        layout.addWidget(self.tree)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def extra_copies(self):
+        return {name for _, _, names in self.groups for name in names[1:]}
+
+
+class RenameWorker(QThread):
+    """ Commits a rename batch off the GUI thread, reporting progress in batches. """
+    progress = pyqtSignal(int, int)  # renamed so far, total
+
+    def __init__(self, folder, batch, index, options, journal, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.batch = batch
+        self.index = index
+        self.options = options
+        self.journal = journal
+        self.batch_id = None
+        self.history = []
+        self.errors = []
+
+    def run(self):
+        self.history, self.errors = engine.commit_batch(
+            self.folder, self.batch, self.index, self.options['conflict_strategy'],
+            self.options['simulation_mode'], stop_on_error=self.options['stop_on_error'],
+            progress=self.progress.emit, journal=self.journal)
+        if self.journal is not None and self.history and not self.options['simulation_mode']:
+            self.batch_id = self.journal.last_batch_id
+
+
+class REnamer(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.rename_history = []
+        self.rename_history_stack = []
+
+        # Background preview state: every option change bumps the generation so
+        # chunks from an older pass are dropped when they arrive
+        self.preview_generation = 0
+        self.preview_worker = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.start_preview)
+
+        # Background folder scan state, cancelled the same way as previews
+        self.scan_generation = 0
+        self.scan_worker = None
+        # Every name in the loaded folder, filled by the scan and used for conflict checks
+        self.name_index = engine.NameIndex()
+        # The unfiltered scan behind the list, so the extension filter is applied
+        # without reading the folder again
+        self.entries = engine.EntryStore()
+        self.scan_filter = None
+        # Stat data of the loaded folder for metadata tokens and sorting, read once per file
+        self.stats = engine.StatCache('')
+        self.hash_cache = None
+        self.duplicates_worker = None
+        self.export_worker = None
+        self.rename_worker = None
+        # Live updates of the loaded folder, held back while a scan or rename is running
+        self.watch_worker = None
+        self.pending_changes = []
+
+        self.journal = None
+
+        self.init_ui()
+        # Reading the journal can wait until the window is up, and the digest
+        # cache until something is hashed
+        QTimer.singleShot(0, self.open_journal)
+
+    def init_ui(self):
+        self.setWindowTitle('REnamer')
+        self.setGeometry(100, 100, 900, 700)
+
+        # Widgets
+        self.folder_label = QLabel('Folder:')
+        self.folder_line_edit = QLineEdit()
+        self.browse_button = QPushButton('Browse')
+        self.refresh_button = QPushButton('Refresh')
+        self.file_list_model = FileListModel(self)
+        self.file_list_view = QTableView()
+        self.file_list_view.setModel(self.file_list_model)
+        self.file_list_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.file_list_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.file_list_view.setShowGrid(False)
+        self.file_list_view.setWordWrap(False)
+        self.file_list_view.verticalHeader().setVisible(False)
+        # Fixed row heights and column widths let the view skip measuring every row
+        self.file_list_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.file_list_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.file_list_view.setColumnWidth(FileListModel.ORIGINAL_COLUMN, 400)
+        self.file_list_view.horizontalHeader().setStretchLastSection(True)
+
+        self.scan_status_label = QLabel()
+        self.scan_progress_bar = QProgressBar()
+        self.scan_progress_bar.setRange(0, 0)  # Busy indicator, the total is unknown while scanning
+        self.scan_progress_bar.setMaximumHeight(12)
+        self.scan_progress_bar.setTextVisible(False)
+        self.scan_progress_bar.hide()
+
+        self.extension_label = QLabel('Filter Extension:')
+        self.extension_line_edit = QLineEdit()
+        self.subfolders_checkbox = QCheckBox('Include Subfolders')
+        self.max_depth_label = QLabel('Max Depth:')
+        self.max_depth_spinbox = QSpinBox()
+        self.max_depth_spinbox.setSpecialValueText('Unlimited')  # Shown for 0
+
+        self.prefix_label = QLabel('Add Prefix:')
+        self.prefix_line_edit = QLineEdit()
+        self.skip_existing_prefix_checkbox = QCheckBox('Skip if Prefix Exists')
+
+        self.suffix_label = QLabel('Add Suffix:')
+        self.suffix_line_edit = QLineEdit()
+        self.skip_existing_suffix_checkbox = QCheckBox('Skip if Suffix Exists')
+
+        self.replace_label = QLabel('Replace Text:')
+        self.replace_line_edit = QLineEdit()
+        self.with_label = QLabel('With:')
+        self.with_line_edit = QLineEdit()
+
+        self.regex_checkbox = QCheckBox('Use Regular Expressions')
+
+        self.case_label = QLabel('Case Conversion:')
+        self.case_combo_box = QComboBox()
+        self.case_combo_box.addItems(['None', 'lowercase', 'UPPERCASE', 'Title Case', 'Sentence case'])
+
+        self.sort_label = QLabel('Sort By:')
+        self.sort_combo_box = QComboBox()
+        self.sort_combo_box.addItems(['None', 'Name', 'Modified', 'Size'])
+
+        self.numbering_checkbox = QCheckBox('Add Numbering')
+        self.numbering_start_label = QLabel('Start:')
+        self.numbering_start_spinbox = QSpinBox()
+        self.numbering_start_spinbox.setValue(1)
+        self.numbering_increment_label = QLabel('Increment:')
+        self.numbering_increment_spinbox = QSpinBox()
+        self.numbering_increment_spinbox.setValue(1)
+        self.numbering_padding_label = QLabel('Padding:')
+        self.numbering_padding_spinbox = QSpinBox()
+        self.numbering_padding_spinbox.setValue(1)
+        self.numbering_position_label = QLabel('Position:')
+        self.numbering_position_combo_box = QComboBox()
+        self.numbering_position_combo_box.addItems(['Prefix', 'Suffix'])
+        self.numbering_per_folder_checkbox = QCheckBox('Restart per Folder')
+
+        self.conflict_label = QLabel('On Conflict:')
+        self.conflict_combo_box = QComboBox()
+        self.conflict_combo_box.addItems(['Skip', 'Overwrite', 'Rename'])
+
+        self.simulation_checkbox = QCheckBox('Simulation Mode')
+        self.fix_checkbox = QCheckBox('Apply Fix')
+        self.stop_on_error_checkbox = QCheckBox('Stop on First Error')
+        self.trace_checkbox = QCheckBox('Show Timings')
+
+        self.rename_button = QPushButton('Rename Files')
+        self.undo_button = QPushButton('Undo Last Rename')
+        self.undo_button.setEnabled(False)
+        self.reset_button = QPushButton('Reset')
+
+        self.save_preset_button = QPushButton('Save Preset')
+        self.load_preset_button = QPushButton('Load Preset')
+        self.duplicates_button = QPushButton('Find Duplicates')
+        self.export_plan_button = QPushButton('Export Plan')
+
+        self.status_bar = QStatusBar()
+        self.status_bar.setSizeGripEnabled(False)
+        self.export_trace_button = QPushButton('Export Trace')
+        self.status_bar.addPermanentWidget(self.export_trace_button)
+        self.status_bar.hide()
+
+        # Adding Tooltips
+        self.folder_line_edit.setToolTip('Enter or browse to the folder containing files to rename.')
+        self.browse_button.setToolTip('Click to browse and select a folder.')
+        self.refresh_button.setToolTip('Click to read the folder again after files were changed outside REnamer.')
+        self.extension_line_edit.setToolTip(
+            'Filter files by extension (e.g., .txt). Separate several with commas; wildcards such as IMG_*.jp*g '
+            'match the file name. Leave blank for all files.')
+        self.subfolders_checkbox.setToolTip('Check to also list and rename files in subfolders.')
+        self.max_depth_spinbox.setToolTip('Limit how many subfolder levels are included.')
+
+        self.prefix_line_edit.setToolTip(
+            'Enter text to add at the beginning of file names. {date}, {time}, {size}, {size_kb} and '
+            '{mtime:%Y%m%d} are replaced with the modification date, time and size of each file, '
+            '{hash} or {hash:12} with the start of its SHA-256 content digest.')
+        self.suffix_line_edit.setToolTip(
+            'Enter text to add at the end of file names (before extension). The same tokens as for the '
+            'prefix can be used.')
+
+        self.replace_line_edit.setToolTip('Enter the text you want to replace in file names.')
+        self.with_line_edit.setToolTip('Enter the text that will replace the specified text.')
+        self.regex_checkbox.setToolTip('Check to use regular expressions for find and replace.')
+
+        self.case_combo_box.setToolTip('Select case conversion for file names.')
+        self.sort_combo_box.setToolTip('Choose the order of the list, which is also the order files are numbered in.')
+
+        self.numbering_checkbox.setToolTip('Check to add numbering to file names.')
+        self.numbering_start_spinbox.setToolTip('Set the starting number for numbering.')
+        self.numbering_increment_spinbox.setToolTip('Set the increment between numbers.')
+        self.numbering_padding_spinbox.setToolTip(
+            'Set the number of digits for numbering (e.g., padding of 3 for 001).')
+        self.numbering_position_combo_box.setToolTip('Choose whether to add numbering as a prefix or suffix.')
+        self.numbering_per_folder_checkbox.setToolTip('Start numbering again in every subfolder.')
+
+        self.conflict_combo_box.setToolTip('Select how to handle file name conflicts.')
+        self.simulation_checkbox.setToolTip('Check to simulate renaming without making actual changes.')
+        self.fix_checkbox.setToolTip('Apply predefined fix rules to file names.')
+        self.stop_on_error_checkbox.setToolTip(
+            'Check to stop renaming at the first failure instead of reporting all failures at the end.')
+        self.trace_checkbox.setToolTip(
+            'Check to measure how long scanning, previewing and renaming take, shown below the buttons.')
+        self.export_trace_button.setToolTip('Click to save the measurements as a JSON file.')
+
+        self.rename_button.setToolTip('Click to rename files according to the specified options.')
+        self.undo_button.setToolTip('Click to undo the last renaming action.')
+        self.reset_button.setToolTip('Click to reset all fields to their default values.')
+
+        self.save_preset_button.setToolTip('Click to save current settings as a preset.')
+        self.load_preset_button.setToolTip('Click to load a previously saved preset.')
+        self.duplicates_button.setToolTip('Click to find listed files with identical contents.')
+        self.export_plan_button.setToolTip('Click to save every planned rename with its conflict decision as a '
+                                           'JSONL or CSV file, without renaming. cli.py --apply-plan runs it later.')
+
+        self.file_list_view.setToolTip('Displays the list of files to be renamed.')
+        self.skip_existing_prefix_checkbox.setToolTip('Skip adding the prefix if the file name already starts with it.')
+        self.skip_existing_suffix_checkbox.setToolTip('Skip adding the suffix if the file name already ends with it.')
+
+        # Layouts
+        folder_layout = QHBoxLayout()
+        folder_layout.addWidget(self.folder_label)
+        folder_layout.addWidget(self.folder_line_edit)
+        folder_layout.addWidget(self.browse_button)
+        folder_layout.addWidget(self.refresh_button)
+
+        extension_layout = QHBoxLayout()
+        extension_layout.addWidget(self.extension_label)
+        extension_layout.addWidget(self.extension_line_edit)
+        extension_layout.addWidget(self.subfolders_checkbox)
+        extension_layout.addWidget(self.max_depth_label)
+        extension_layout.addWidget(self.max_depth_spinbox)
+
+        # File list layout (the view's header shows the Original/Preview columns)
+        file_list_layout = QVBoxLayout()
+        file_list_layout.addWidget(self.file_list_view)
+
+        scan_status_layout = QHBoxLayout()
+        scan_status_layout.addWidget(self.scan_status_label)
+        scan_status_layout.addWidget(self.scan_progress_bar)
+        file_list_layout.addLayout(scan_status_layout)
+
+        prefix_layout = QHBoxLayout()
+        prefix_layout.addWidget(self.prefix_label)
+        prefix_layout.addWidget(self.prefix_line_edit)
+        prefix_layout.addWidget(self.skip_existing_prefix_checkbox)
+
+        suffix_layout = QHBoxLayout()
+        suffix_layout.addWidget(self.suffix_label)
+        suffix_layout.addWidget(self.suffix_line_edit)
+        suffix_layout.addWidget(self.skip_existing_suffix_checkbox)
+
+        replace_layout = QHBoxLayout()
+        replace_layout.addWidget(self.replace_label)
+        replace_layout.addWidget(self.replace_line_edit)
+        replace_layout.addWidget(self.with_label)
+        replace_layout.addWidget(self.with_line_edit)
+        replace_layout.addWidget(self.regex_checkbox)
+
+        case_layout = QHBoxLayout()
+        case_layout.addWidget(self.case_label)
+        case_layout.addWidget(self.case_combo_box)
+        case_layout.addWidget(self.sort_label)
+        case_layout.addWidget(self.sort_combo_box)
+
+        numbering_layout = QHBoxLayout()
+        numbering_layout.addWidget(self.numbering_checkbox)
+        numbering_layout.addWidget(self.numbering_start_label)
+        numbering_layout.addWidget(self.numbering_start_spinbox)
+        numbering_layout.addWidget(self.numbering_increment_label)
+        numbering_layout.addWidget(self.numbering_increment_spinbox)
+        numbering_layout.addWidget(self.numbering_padding_label)
+        numbering_layout.addWidget(self.numbering_padding_spinbox)
+        numbering_layout.addWidget(self.numbering_position_label)
+        numbering_layout.addWidget(self.numbering_position_combo_box)
+        numbering_layout.addWidget(self.numbering_per_folder_checkbox)
+
+        conflict_layout = QHBoxLayout()
+        conflict_layout.addWidget(self.conflict_label)
+        conflict_layout.addWidget(self.conflict_combo_box)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(self.simulation_checkbox)
+        options_layout.addWidget(self.fix_checkbox)
+        options_layout.addWidget(self.stop_on_error_checkbox)
+        options_layout.addWidget(self.trace_checkbox)
+
+        actions_layout = QHBoxLayout()
+        actions_layout.addWidget(self.rename_button)
+        actions_layout.addWidget(self.undo_button)
+        actions_layout.addWidget(self.reset_button)
+        actions_layout.addWidget(self.save_preset_button)
+        actions_layout.addWidget(self.load_preset_button)
+        actions_layout.addWidget(self.duplicates_button)
+        actions_layout.addWidget(self.export_plan_button)
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(folder_layout)
+        main_layout.addLayout(extension_layout)
+        main_layout.addLayout(file_list_layout)
+        main_layout.addLayout(prefix_layout)
+        main_layout.addLayout(suffix_layout)
+        main_layout.addLayout(replace_layout)
+        main_layout.addLayout(case_layout)
+        main_layout.addLayout(numbering_layout)
+        main_layout.addLayout(conflict_layout)
+        main_layout.addLayout(options_layout)
+        main_layout.addLayout(actions_layout)
+        main_layout.addWidget(self.status_bar)
+
+        self.setLayout(main_layout)
+
+        # Signals and Slots
+        self.browse_button.clicked.connect(self.browse_folder)
+        self.refresh_button.clicked.connect(self.reload_files)
+        self.rename_button.clicked.connect(self.rename_files)
+        self.undo_button.clicked.connect(self.undo_rename)
+        self.reset_button.clicked.connect(self.reset_fields)
+        self.save_preset_button.clicked.connect(self.save_preset)
+        self.load_preset_button.clicked.connect(self.load_preset)
+        self.duplicates_button.clicked.connect(self.find_duplicates)
+        self.export_plan_button.clicked.connect(self.export_plan)
+        self.trace_checkbox.stateChanged.connect(self.toggle_trace)
+        self.export_trace_button.clicked.connect(self.export_trace)
+        self.numbering_checkbox.stateChanged.connect(self.toggle_numbering_options)
+        self.file_list_view.selectionModel().selectionChanged.connect(self.preview_changes)
+
+        # Connect renaming option changes to preview update
+        self.prefix_line_edit.textChanged.connect(self.preview_changes)
+        self.suffix_line_edit.textChanged.connect(self.preview_changes)
+        self.skip_existing_prefix_checkbox.stateChanged.connect(self.preview_changes)
+        self.skip_existing_suffix_checkbox.stateChanged.connect(self.preview_changes)
+        self.replace_line_edit.textChanged.connect(self.preview_changes)
+        self.with_line_edit.textChanged.connect(self.preview_changes)
+        self.regex_checkbox.stateChanged.connect(self.preview_changes)
+        self.case_combo_box.currentIndexChanged.connect(self.preview_changes)
+        self.sort_combo_box.currentIndexChanged.connect(self.sort_files)
+        self.numbering_checkbox.stateChanged.connect(self.preview_changes)
+        self.numbering_start_spinbox.valueChanged.connect(self.preview_changes)
+        self.numbering_increment_spinbox.valueChanged.connect(self.preview_changes)
+        self.numbering_padding_spinbox.valueChanged.connect(self.preview_changes)
+        self.numbering_position_combo_box.currentIndexChanged.connect(self.preview_changes)
+        self.numbering_per_folder_checkbox.stateChanged.connect(self.preview_changes)
+        self.fix_checkbox.stateChanged.connect(self.preview_changes)
+        self.extension_line_edit.textChanged.connect(self.filter_files)
+        self.subfolders_checkbox.stateChanged.connect(self.toggle_subfolder_options)
+        self.subfolders_checkbox.stateChanged.connect(self.reload_files)
+        self.max_depth_spinbox.valueChanged.connect(self.reload_files)
+
+        # Initialize numbering and subfolder options state
+        self.toggle_numbering_options()
+        self.toggle_subfolder_options()
+
+    def open_journal(self):
+        """
+        Open the rename journal, settle batches interrupted by a crash and restore
+        the undo stack of earlier sessions. Without a writable journal, undo only
+        covers the current session.
+        """
+        try:
+            self.journal = RenameJournal(JOURNAL_FILE)
+        except (OSError, ValueError):
+            self.journal = None
+            return
+
+        if self.journal.incomplete():
+            answer = QMessageBox.question(
+                self, 'Interrupted Rename',
+                'A previous rename was interrupted.\n'
+                'Yes: finish the interrupted rename. No: roll it back.')
+            failures = self.journal.recover(replay=answer == QMessageBox.StandardButton.Yes)
+            if failures:
+                QMessageBox.critical(self, 'Error', f'Failed to recover {len(failures)} file(s):\n'
+                                     + engine.format_errors([(new, e) for _, new, e in failures]))
+        self.journal.compact()
+        self.rename_history_stack = [batch.batch_id for batch in self.journal.committed()]
+        self.undo_button.setEnabled(bool(self.rename_history_stack))
+
+    def open_hash_cache(self):
+        """ Open the digest cache, so files hashed in earlier sessions are not read again. """
+        from hashcache import HashCache
+        try:
+            self.hash_cache = HashCache(HASH_CACHE_FILE)
+        except OSError:
+            self.hash_cache = None  # Digests are then only kept for this session
+
+    def toggle_numbering_options(self):
+        enabled = self.numbering_checkbox.isChecked()
+        self.numbering_start_label.setEnabled(enabled)
+        self.numbering_start_spinbox.setEnabled(enabled)
+        self.numbering_increment_label.setEnabled(enabled)
+        self.numbering_increment_spinbox.setEnabled(enabled)
+        self.numbering_padding_label.setEnabled(enabled)
+        self.numbering_padding_spinbox.setEnabled(enabled)
+        self.numbering_position_label.setEnabled(enabled)
+        self.numbering_position_combo_box.setEnabled(enabled)
+        self.numbering_per_folder_checkbox.setEnabled(enabled and self.subfolders_checkbox.isChecked())
+        self.preview_changes()  # Update preview when numbering options are toggled
+
+    def toggle_subfolder_options(self):
+        enabled = self.subfolders_checkbox.isChecked()
+        self.max_depth_label.setEnabled(enabled)
+        self.max_depth_spinbox.setEnabled(enabled)
+        self.numbering_per_folder_checkbox.setEnabled(enabled and self.numbering_checkbox.isChecked())
+
+    def toggle_trace(self):
+        """ Start measuring from scratch, or stop measuring and hide the results. """
+        TRACE.enabled = self.trace_checkbox.isChecked()
+        TRACE.reset()
+        self.status_bar.setVisible(TRACE.enabled)
+        self.update_trace_status()
+
+    def update_trace_status(self):
+        if TRACE.enabled:
+            self.status_bar.showMessage(TRACE.summary())
+
+    def export_trace(self):
+        trace_file, _ = QFileDialog.getSaveFileName(self, 'Export Trace', '', 'JSON Files (*.json)')
+        if trace_file:
+            try:
+                TRACE.export(trace_file)
+            except OSError as e:
+                QMessageBox.critical(self, 'Error', f'Failed to export trace:\n{e}')
+
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, 'Select Folder')
+        if folder:
+            self.open_folder(folder)
+
+    def open_folder(self, folder):
+        self.folder_line_edit.setText(folder)
+        self.load_files(folder)
+
+    def load_files(self, folder):
+        self.cancel_preview()
+        self.cancel_scan()
+        self.start_watch(folder)
+        self.name_index = engine.NameIndex()
+        self.entries = engine.EntryStore()
+        self.file_list_model.set_store(self.entries)
+        self.scan_filter = engine.compile_filter(self.extension_line_edit.text())
+        if self.hash_cache is None:
+            self.open_hash_cache()
+        self.stats = engine.StatCache(folder, self.hash_cache)
+        # Stat data is collected by the scan when needed now, else read on first use
+        scan_stats = self.stats if engine.needs_stats(self.current_options()) else None
+        worker = ScanWorker(self.scan_generation, folder, self.subfolders_checkbox.isChecked(),
+                            self.max_depth_spinbox.value(), self.name_index, scan_stats, self)
+        worker.batch_ready.connect(self.on_scan_batch)
+        worker.failed.connect(self.on_scan_failed)
+        worker.finished.connect(self.on_scan_finished)
+        worker.finished.connect(worker.deleteLater)
+        self.scan_worker = worker
+        self.scan_status_label.setText('Scanning...')
+        self.scan_progress_bar.show()
+        worker.start()
+
+    def cancel_scan(self):
+        self.scan_generation += 1
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+            self.scan_worker = None
+        self.scan_progress_bar.hide()
+
+    def start_watch(self, folder):
+        """ Watch folder from before the scan starts, so nothing added in between is missed. """
+        self.stop_watch()
+        worker = WatchWorker(self.scan_generation, folder, self.subfolders_checkbox.isChecked(),
+                             self.max_depth_spinbox.value(), self)
+        worker.changes_ready.connect(self.on_folder_changes)
+        worker.finished.connect(worker.deleteLater)
+        self.watch_worker = worker
+        worker.start()
+
+    def stop_watch(self):
+        self.pending_changes = []
+        if self.watch_worker is not None:
+            self.watch_worker.cancel()
+            self.watch_worker = None
+
+    def on_folder_changes(self, generation, changes):
+        if generation != self.scan_generation:
+            return
+        self.pending_changes.extend(changes)
+        if self.scan_worker is None and self.rename_worker is None:
+            self.apply_folder_changes()
+
+    def apply_folder_changes(self):
+        """
+        Bring the list up to date with what the watcher reported. Every change is
+        checked against the disk, so the echoes of REnamer's own renames and
+        events overtaken by later ones are dropped.
+        """
+        changes, self.pending_changes = self.pending_changes, []
+        folder = self.folder_line_edit.text()
+        if not changes or not folder:
+            return
+        if any(kind == 'overflow' for kind, _, _ in changes):
+            self.load_files(folder)
+            return
+
+        def exists(name):
+            return os.path.lexists(os.path.join(folder, name))
+
+        # Renames keep their row; everything else is settled by what is on disk now
+        moved = []
+        touched = set()
+        for kind, name, new_name in changes:
+            if kind == 'moved':
+                if name in self.entries and new_name not in self.entries \
+                        and not exists(name) and exists(new_name):
+                    moved.append((name, new_name))
+                    self.entries.rename([(name, new_name)])
+                    self.stats.rename([(name, new_name)])
+                touched.update((name, new_name))
+            elif kind == 'deleted_dir':
+                prefix = name + os.sep
+                touched.update(listed for listed in self.entries.names if listed.startswith(prefix))
+            elif kind == 'modified':
+                self.stats.discard([name])  # Read again by the next preview
+            else:
+                touched.add(name)
+        created = sorted(name for name in touched if name not in self.entries and exists(name))
+        deleted = {name for name in touched if name in self.entries and not exists(name)}
+
+        model = self.file_list_model
+        options = self.current_options()
+        shifted = model.rowCount()  # First table row whose number may change, as rows above it came or went
+        if deleted:
+            for name in deleted:
+                self.name_index.discard(name)
+            self.stats.discard(deleted)
+            removed = model.table_rows(self.entries.remove(deleted))
+            model.remove_rows(removed)
+            shifted = min(removed, default=shifted)
+        changed = []  # Store rows to preview again
+        if moved:
+            for name, new_name in moved:
+                self.name_index.move(name, new_name)
+            rows = [self.entries.row(new_name) for _, new_name in moved]
+            model.rows_changed(model.table_rows(rows))
+            changed.extend(rows)
+            if options['add_numbering'] and options['numbering_per_folder']:
+                # A file moved to another folder changes the count of both from its row on
+                between = [self.entries.row(new_name) for name, new_name in moved
+                           if os.path.dirname(name) != os.path.dirname(new_name)]
+                shifted = min(model.table_rows(between), default=shifted)
+        if created:
+            self.name_index.update(created)
+            rows = self.entries.extend(created)
+            if self.scan_filter is not None:
+                rows = [row for row in rows if self.scan_filter(self.entries.names[row])]
+            key = engine.sort_key(options['sort_by'], self.stats)
+            if key is None:
+                model.append_rows(rows)
+            elif len(rows) > PREVIEW_CHUNK_SIZE:
+                self.update_file_count()
+                model.append_rows(rows)
+                self.sort_files()  # Cheaper than finding the place of every new file
+                return
+            else:
+                # New files go to their place in the order
+                names = self.entries.names
+                for row in sorted(rows, key=lambda row: key(names[row])):
+                    position = model.insert_position(key, key(names[row]))
+                    model.insert_rows(position, [row])
+                    if position < model.rowCount() - 1:
+                        shifted = min(shifted, position)
+            changed.extend(rows)
+        self.update_file_count()
+
+        rows = set(model.table_rows(changed))
+        if options['add_numbering']:
+            rows.update(range(shifted, model.rowCount()))
+        self.refresh_previews(sorted(rows))
+
+    def refresh_previews(self, rows):
+        """ Recompute the preview of just these rows, or run a full pass when one is due anyway or is cheaper. """
+        if not rows:
+            return
+        if self.preview_timer.isActive() or self.preview_worker is not None:
+            self.preview_changes()  # A full pass is due; it must see the new names
+            return
+        if len(rows) > PREVIEW_CHUNK_SIZE:
+            self.preview_changes()  # Off the GUI thread
+            return
+        model = self.file_list_model
+        options = self.current_options()
+        selected_rows = self.selected_rows()
+        if engine.numbers_depend_on_names(options, selected_rows):
+            names = model.names()
+        else:
+            names = {row: model.original_name(row) for row in rows}
+        try:
+            previews = engine.preview_rows(names, rows, options, selected_rows, self.stats)
+        except re.error:
+            previews = {}
+        model.update_rows({row: (names[row], previews.get(row, '')) for row in rows})
+
+    def on_scan_batch(self, generation, names):
+        if generation == self.scan_generation:
+            with TRACE.phase('list') as phase:
+                rows = self.entries.extend(names)
+                if self.scan_filter is not None:
+                    rows = [row for row in rows if self.scan_filter(self.entries.names[row])]
+                self.file_list_model.append_rows(rows)
+                phase.add(len(names))
+            self.scan_status_label.setText(f'Scanning... {len(self.entries):,} files')
+
+    def on_scan_failed(self, generation, message):
+        if generation == self.scan_generation:
+            QMessageBox.critical(self, 'Error', f'Failed to read folder:\n{message}')
+
+    def on_scan_finished(self):
+        if self.sender() is not self.scan_worker:
+            return  # A cancelled scan finishing late
+        self.scan_worker = None
+        self.scan_progress_bar.hide()
+        if self.sort_combo_box.currentText() != 'None':
+            self.file_list_model.set_rows(self.sorted_rows(self.file_list_model.rows))
+        self.update_file_count()
+        self.update_trace_status()
+        self.preview_changes()  # Update preview after loading files
+        self.apply_folder_changes()
+
+    def reload_files(self):
+        folder = self.folder_line_edit.text()
+        if folder:
+            self.load_files(folder)
+
+    def filter_files(self):
+        """ Apply the extension filter to the cached scan instead of reading the folder again. """
+        folder = self.folder_line_edit.text()
+        if not folder:
+            return
+        if not self.entries and self.scan_worker is None:
+            self.load_files(folder)  # Nothing cached yet
+            return
+        self.cancel_preview()
+        filter_ext = self.extension_line_edit.text()
+        self.scan_filter = engine.compile_filter(filter_ext)
+        with TRACE.phase('filter') as phase:
+            rows = self.entries.filter_rows(filter_ext)
+            phase.add(len(self.entries))
+        if self.scan_worker is None:  # A running scan sorts when it ends
+            rows = self.sorted_rows(rows)
+        self.file_list_model.set_rows(rows)
+        if self.scan_worker is None:  # Otherwise the scan updates both when it ends
+            self.update_file_count()
+            self.preview_changes()
+
+    def sorted_rows(self, rows):
+        """ Store rows in the order chosen under Sort By; stat data comes from the cache. """
+        key = engine.sort_key(self.sort_combo_box.currentText(), self.stats)
+        if key is None:
+            return sorted(rows)  # Store rows are in scan order
+        names = self.entries.names
+        with TRACE.phase('sort') as phase:
+            rows = sorted(rows, key=lambda row: key(names[row]))
+            phase.add(len(rows))
+        return rows
+
+    def sort_files(self):
+        """ Reorder the list after Sort By changed; numbering follows the new order. """
+        if self.scan_worker is not None:
+            return  # The scan sorts when it ends
+        if self.rename_worker is not None:
+            return  # Its results are matched to the rows they were started with
+        self.cancel_preview()
+        self.file_list_model.set_rows(self.sorted_rows(self.file_list_model.rows))
+        self.preview_changes()
+
+    def find_duplicates(self):
+        if not self.folder_line_edit.text() or self.duplicates_worker is not None:
+            return
+        if self.scan_worker is not None:
+            QMessageBox.warning(self, 'Warning', 'Please wait until the folder has finished loading.')
+            return
+        worker = DuplicatesWorker(self.file_list_model.names(), self.stats, self)
+        worker.found.connect(self.show_duplicates)
+        worker.finished.connect(worker.deleteLater)
+        self.duplicates_worker = worker
+        self.duplicates_button.setEnabled(False)
+        self.scan_status_label.setText('Looking for duplicates...')
+        self.scan_progress_bar.show()
+        worker.start()
+
+    def show_duplicates(self, groups):
+        self.duplicates_worker = None
+        self.duplicates_button.setEnabled(True)
+        self.scan_progress_bar.hide()
+        self.update_file_count()
+        self.update_trace_status()
+        if not groups:
+            QMessageBox.information(self, 'Duplicates', 'No duplicates found.')
+            return
+        dialog = DuplicatesDialog(groups, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.select_names(dialog.extra_copies())
+
+    def select_names(self, names):
+        """ Select the table rows showing these names, replacing the selection. """
+        model = self.file_list_model
+        selection = QItemSelection()
+        store_rows = [row for row in map(self.entries.row, names) if row is not None]
+        for row in model.table_rows(store_rows):
+            selection.select(model.index(row, 0), model.index(row, model.columnCount() - 1))
+        self.file_list_view.selectionModel().select(
+            selection, QItemSelectionModel.SelectionFlag.ClearAndSelect | QItemSelectionModel.SelectionFlag.Rows)
+
+    def update_file_count(self):
+        shown = self.file_list_model.rowCount()
+        if shown == len(self.entries):
+            self.scan_status_label.setText(f'{shown:,} files')
+        else:
+            self.scan_status_label.setText(f'{shown:,} of {len(self.entries):,} files')
+
+    def selected_rows(self):
+        """ Selected row numbers, or None when nothing is selected (apply to all). """
+        rows = {index.row() for index in self.file_list_view.selectionModel().selectedRows()}
+        return rows or None
+
+    def preview_changes(self):
+        """ Schedule a preview pass; bursts of changes are coalesced into one. """
+        self.cancel_preview()
+        if self.folder_line_edit.text():
+            self.preview_timer.start()
+
+    def cancel_preview(self):
+        self.preview_timer.stop()
+        self.preview_generation += 1
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_worker = None
+
+    def start_preview(self):
+        options = self.current_options()
+        try:
+            engine.compile_rules(options)  # Report a bad pattern once, not per row
+        except re.error as e:
+            self.file_list_model.set_previews([''] * self.file_list_model.rowCount())
+            QMessageBox.critical(self, 'Regex Error', f'Invalid regular expression:\n{e}')
+            return
+        worker = PreviewWorker(self.preview_generation, self.file_list_model.names(),
+                               options, self.selected_rows(), self.stats, self)
+        worker.chunk_ready.connect(self.on_preview_chunk)
+        worker.failed.connect(self.on_preview_failed)
+        worker.finished.connect(self.on_preview_finished)
+        worker.finished.connect(worker.deleteLater)
+        self.preview_worker = worker
+        worker.start()
+
+    def on_preview_chunk(self, generation, start, previews):
+        if generation == self.preview_generation:
+            with TRACE.phase('list') as phase:
+                self.file_list_model.set_preview_range(start, previews)
+                phase.add(len(previews))
+
+    def on_preview_finished(self):
+        if self.sender() is self.preview_worker:
+            self.preview_worker = None
+            self.update_trace_status()
+
+    def on_preview_failed(self, generation, message):
+        if generation == self.preview_generation:
+            QMessageBox.critical(self, 'Regex Error', f'Invalid regular expression:\n{message}')
+
+    def ensure_preview_current(self):
+        """
+        Make sure the preview column matches the current options before it is
+        used for renaming, finishing any pending pass on the GUI thread.
+        Returns False if the options are invalid.
+        """
+        if not self.preview_timer.isActive() and self.preview_worker is None:
+            return True
+        self.cancel_preview()
+        try:
+            for start, previews in engine.iter_previews(
+                    self.file_list_model.names(), self.current_options(), self.selected_rows(),
+                    stats=self.stats):
+                self.file_list_model.set_preview_range(start, previews)
+        except re.error as e:
+            QMessageBox.critical(self, 'Regex Error', f'Invalid regular expression:\n{e}')
+            return False
+        return True
+
+    def closeEvent(self, event):
+        workers = [w for w in (self.preview_worker, self.scan_worker, self.rename_worker, self.watch_worker,
+                               self.duplicates_worker, self.export_worker) if w is not None]
+        self.cancel_preview()
+        self.cancel_scan()
+        self.stop_watch()
+        for worker in workers:
+            worker.wait()
+        if self.journal is not None:
+            self.journal.close()
+        if self.hash_cache is not None:
+            self.hash_cache.close()
+        super().closeEvent(event)
+
+    def rename_files(self):
+        folder = self.folder_line_edit.text()
+        if not folder:
+            QMessageBox.warning(self, 'Warning', 'Please select a folder.')
+            return
+
+        if self.scan_worker is not None:
+            QMessageBox.warning(self, 'Warning', 'Please wait until the folder has finished loading.')
+            return
+
+        if not self.ensure_preview_current():
+            return
+
+        batch, rows_by_path = self.planned_batch(folder)
+        if not batch:
+            QMessageBox.information(self, 'No Changes', 'No files were renamed.')
+            return
+
+        # The worker plans the whole batch first so swaps and renumbering chains
+        # work, then commits it concurrently
+        worker = RenameWorker(folder, batch, self.name_index, self.current_options(), self.journal, self)
+        worker.progress.connect(self.on_rename_progress)
+        worker.finished.connect(lambda: self.on_rename_finished(worker, rows_by_path))
+        worker.finished.connect(worker.deleteLater)
+        self.rename_worker = worker
+        self.set_busy(True)
+        self.scan_status_label.setText(f'Renaming 0 of {len(batch):,} files...')
+        self.scan_progress_bar.setRange(0, len(batch))
+        self.scan_progress_bar.setValue(0)
+        self.scan_progress_bar.show()
+        worker.start()
+
+    def planned_batch(self, folder):
+        """ The (old_name, new_name) pairs of the selected rows that change, and the row of every old path. """
+        # Get selected rows
+        selected_rows = self.selected_rows()
+
+        rows_by_path = {}
+        batch = []
+        for i in range(self.file_list_model.rowCount()):
+            if selected_rows is not None and i not in selected_rows:
+                continue  # Skip rows not selected
+
+            old_name = self.file_list_model.original_name(i)
+            new_name = self.file_list_model.preview_name(i)
+
+            if not new_name or old_name == new_name:
+                continue  # Skip if no changes
+
+            rows_by_path[os.path.join(folder, old_name)] = i
+            batch.append((old_name, new_name))
+        return batch, rows_by_path
+
+    def export_plan(self):
+        """
+        Save what Rename Files would do, conflict decisions included, as a plan
+        file, without renaming. The plan is made against a copy of the index, so
+        the list stays as it is.
+        """
+        folder = self.folder_line_edit.text()
+        if not folder or self.export_worker is not None:
+            return
+        if self.scan_worker is not None:
+            QMessageBox.warning(self, 'Warning', 'Please wait until the folder has finished loading.')
+            return
+        if not self.ensure_preview_current():
+            return
+        batch, _ = self.planned_batch(folder)
+        if not batch:
+            QMessageBox.information(self, 'No Changes', 'No files would be renamed.')
+            return
+        plan_file, selected_filter = QFileDialog.getSaveFileName(
+            self, 'Export Plan', '', 'JSON Lines Files (*.jsonl);;CSV Files (*.csv)')
+        if not plan_file:
+            return
+        if not os.path.splitext(plan_file)[1]:
+            plan_file += '.csv' if selected_filter.startswith('CSV') else '.jsonl'
+
+        worker = PlanExportWorker(plan_file, folder, batch, self.name_index.copy(), self.current_options(), self)
+        worker.exported.connect(lambda counts: self.on_plan_exported(plan_file, counts))
+        worker.failed.connect(self.on_plan_export_failed)
+        worker.finished.connect(worker.deleteLater)
+        self.export_worker = worker
+        self.export_plan_button.setEnabled(False)
+        self.scan_status_label.setText('Exporting plan...')
+        self.scan_progress_bar.show()
+        worker.start()
+
+    def on_plan_export_done(self):
+        self.export_worker = None
+        self.export_plan_button.setEnabled(True)
+        self.scan_progress_bar.hide()
+        self.update_file_count()
+
+    def on_plan_exported(self, plan_file, counts):
+        self.on_plan_export_done()
+        summary = ', '.join(f'{count:,} {action}' for action, count in counts.items() if count)
+        QMessageBox.information(self, 'Plan Exported', f'Saved the plan to {plan_file}:\n{summary}')
+
+    def on_plan_export_failed(self, message):
+        self.on_plan_export_done()
+        QMessageBox.critical(self, 'Error', f'Failed to export plan:\n{message}')
+
+    def set_busy(self, busy):
+        """ Lock the controls that would change the file list while a batch is committed. """
+        for widget in (self.folder_line_edit, self.browse_button, self.refresh_button, self.extension_line_edit,
+                       self.subfolders_checkbox, self.max_depth_spinbox, self.rename_button,
+                       self.undo_button, self.reset_button, self.load_preset_button, self.duplicates_button,
+                       self.export_plan_button, self.sort_combo_box):
+            widget.setEnabled(not busy)
+        if not busy:
+            self.toggle_subfolder_options()
+            self.undo_button.setEnabled(bool(self.rename_history_stack))
+
+    def on_rename_progress(self, done, total):
+        self.scan_progress_bar.setMaximum(total)
+        self.scan_progress_bar.setValue(done)
+        self.scan_status_label.setText(f'Renaming {done:,} of {total:,} files...')
+
+    def on_rename_finished(self, worker, rows_by_path):
+        folder = worker.folder
+        history = worker.history
+        errors = worker.errors
+        self.rename_worker = None
+        self.scan_progress_bar.hide()
+        self.scan_progress_bar.setRange(0, 0)
+
+        self.rename_history = list(history)
+        if history:
+            # Journaled batches are undone from the journal; simulated ones only
+            # need the list restored; otherwise the path pairs are kept in memory
+            if worker.batch_id is not None:
+                self.rename_history_stack.append(worker.batch_id)
+            elif worker.options['simulation_mode']:
+                self.rename_history_stack.append(('simulation', list(history)))
+            else:
+                self.rename_history_stack.append(list(history))
+        for old_path, new_path in history:
+            # Update the original name column to the new name
+            self.file_list_model.update_original_name(rows_by_path[old_path], os.path.relpath(new_path, folder))
+        self.stats.rename([(os.path.relpath(old_path, folder), os.path.relpath(new_path, folder))
+                           for old_path, new_path in history])
+        self.update_file_count()
+        self.set_busy(False)
+        self.update_trace_status()
+        self.apply_folder_changes()
+
+        # One report for the whole batch instead of a dialog per failure
+        if errors:
+            QMessageBox.critical(self, 'Error', f'Failed to rename {len(errors)} file(s):\n'
+                                 f'{engine.format_errors(errors)}')
+
+        if self.rename_history:
+            if worker.options['simulation_mode']:
+                QMessageBox.information(self, 'Simulation Complete', 'Simulation mode is ON. No files were renamed.')
+            elif not errors:
+                QMessageBox.information(self, 'Success', 'Files renamed successfully!')
+            self.preview_changes()  # Update preview after renaming
+        elif not errors:
+            QMessageBox.information(self, 'No Changes', 'No files were renamed.')
+
+    def undo_rename(self):
+        if not self.rename_history_stack:
+            return
+        rename_history = self.rename_history_stack.pop()
+        # Every source yields (old_path, new_path, error) per move
+        if isinstance(rename_history, int):
+            results = self.journal.undo(rename_history)
+        elif isinstance(rename_history, tuple):
+            # Simulated batch: nothing was renamed on disk, only the list changed
+            results = ((old_path, new_path, None) for old_path, new_path in rename_history[1])
+        else:
+            reverted, failed = engine.revert_history(rename_history)
+            results = [(old_path, new_path, None) for old_path, new_path in reverted]
+            results += [(None, new_path, e) for new_path, e in failed]
+
+        folder = self.folder_line_edit.text()
+        restored = {}
+        errors = []
+        for old_path, new_path, e in results:
+            if e is not None:
+                errors.append((new_path, e))
+            elif folder:
+                current_name = os.path.relpath(new_path, folder)
+                if not current_name.startswith(os.pardir):  # Batches of other folders are not listed
+                    restored[current_name] = os.path.relpath(old_path, folder)
+        self.restore_rows(restored)
+
+        if not self.rename_history_stack:
+            self.undo_button.setEnabled(False)
+        if errors:
+            # The other reversals were applied; report all failures at once
+            QMessageBox.critical(self, 'Error', f'Failed to undo {len(errors)} rename(s):\n'
+                                 f'{engine.format_errors(errors)}')
+            return
+        QMessageBox.information(self, 'Success', 'Undo completed!')
+
+    def restore_rows(self, restored):
+        """
+        Put the names undone by undo_rename ({current name: restored name}) back
+        into the list and refresh the preview of just those rows.
+        """
+        if not restored:
+            return
+        if self.scan_worker is not None:
+            self.load_files(self.folder_line_edit.text())  # The list is still being built
+            return
+
+        for current_name, restored_name in restored.items():
+            self.name_index.move(current_name, restored_name)
+        self.stats.rename(restored.items())
+        rows = self.file_list_model.table_rows(self.entries.rename(restored.items()))
+        self.file_list_model.rows_changed(rows)
+        self.refresh_previews(rows)
+
+    def reset_fields(self):
+        # Clear input fields
+        self.folder_line_edit.clear()
+        self.extension_line_edit.clear()
+        self.prefix_line_edit.clear()
+        self.suffix_line_edit.clear()
+        self.replace_line_edit.clear()
+        self.with_line_edit.clear()
+
+        # Uncheck checkboxes
+        self.regex_checkbox.setChecked(False)
+        self.numbering_checkbox.setChecked(False)
+        self.simulation_checkbox.setChecked(False)
+        self.stop_on_error_checkbox.setChecked(False)
+        self.skip_existing_prefix_checkbox.setChecked(False)
+        self.skip_existing_suffix_checkbox.setChecked(False)
+        self.fix_checkbox.setChecked(False)
+        self.subfolders_checkbox.setChecked(False)
+        self.numbering_per_folder_checkbox.setChecked(False)
+
+        # Reset combo boxes
+        self.case_combo_box.setCurrentIndex(0)
+        self.sort_combo_box.setCurrentIndex(0)
+        self.numbering_position_combo_box.setCurrentIndex(0)
+        self.conflict_combo_box.setCurrentIndex(0)
+
+        # Reset spin boxes
+        self.numbering_start_spinbox.setValue(1)
+        self.numbering_increment_spinbox.setValue(1)
+        self.numbering_padding_spinbox.setValue(1)
+        self.max_depth_spinbox.setValue(0)
+
+        # Clear file list and disable undo button
+        self.cancel_scan()
+        self.stop_watch()
+        self.entries = engine.EntryStore()
+        self.file_list_model.set_store(self.entries)
+        self.stats = engine.StatCache('')
+        self.scan_status_label.clear()
+        self.undo_button.setEnabled(False)
+        self.rename_history = []
+        self.rename_history_stack.clear()
+
+        # Reset numbering options state
+        self.toggle_numbering_options()
+
+    def current_options(self):
+        """ Collect the rename options from the widgets, in the preset format. """
+        return {
+            'prefix': self.prefix_line_edit.text(),
+            'suffix': self.suffix_line_edit.text(),
+            'skip_existing_prefix': self.skip_existing_prefix_checkbox.isChecked(),
+            'skip_existing_suffix': self.skip_existing_suffix_checkbox.isChecked(),
+            'replace_text': self.replace_line_edit.text(),
+            'with_text': self.with_line_edit.text(),
+            'use_regex': self.regex_checkbox.isChecked(),
+            'case_option': self.case_combo_box.currentText(),
+            'add_numbering': self.numbering_checkbox.isChecked(),
+            'numbering_start': self.numbering_start_spinbox.value(),
+            'numbering_increment': self.numbering_increment_spinbox.value(),
+            'numbering_padding': self.numbering_padding_spinbox.value(),
+            'numbering_position': self.numbering_position_combo_box.currentText(),
+            'conflict_strategy': self.conflict_combo_box.currentText(),
+            'simulation_mode': self.simulation_checkbox.isChecked(),
+            'stop_on_error': self.stop_on_error_checkbox.isChecked(),
+            'filter_extension': self.extension_line_edit.text(),
+            'apply_fix': self.fix_checkbox.isChecked(),
+            'include_subfolders': self.subfolders_checkbox.isChecked(),
+            'max_depth': self.max_depth_spinbox.value(),
+            'numbering_per_folder': self.numbering_per_folder_checkbox.isChecked(),
+            'sort_by': self.sort_combo_box.currentText(),
+        }
+
+    def save_preset(self):
+        preset = self.current_options()
+        preset_file, _ = QFileDialog.getSaveFileName(self, 'Save Preset', '', 'JSON Files (*.json)')
+        if preset_file:
+            try:
+                with open(preset_file, 'w') as f:
+                    json.dump(preset, f)
+                QMessageBox.information(self, 'Success', 'Preset saved successfully!')
+            except Exception as e:
+                QMessageBox.critical(self, 'Error', f'Failed to save preset:\n{e}')
+
+    def load_preset(self):
+        preset_file, _ = QFileDialog.getOpenFileName(self, 'Load Preset', '', 'JSON Files (*.json)')
+        if preset_file:
+            try:
+                with open(preset_file, 'r') as f:
+                    preset = json.load(f)
+                self.prefix_line_edit.setText(preset.get('prefix', ''))
+                self.suffix_line_edit.setText(preset.get('suffix', ''))
+                self.skip_existing_prefix_checkbox.setChecked(preset.get('skip_existing_prefix', False))
+                self.skip_existing_suffix_checkbox.setChecked(preset.get('skip_existing_suffix', False))
+                self.replace_line_edit.setText(preset.get('replace_text', ''))
+                self.with_line_edit.setText(preset.get('with_text', ''))
+                self.regex_checkbox.setChecked(preset.get('use_regex', False))
+                self.case_combo_box.setCurrentText(preset.get('case_option', 'None'))
+                self.numbering_checkbox.setChecked(preset.get('add_numbering', False))
+                self.numbering_start_spinbox.setValue(preset.get('numbering_start', 1))
+                self.numbering_increment_spinbox.setValue(preset.get('numbering_increment', 1))
+                self.numbering_padding_spinbox.setValue(preset.get('numbering_padding', 1))
+                self.numbering_position_combo_box.setCurrentText(preset.get('numbering_position', 'Prefix'))
+                self.conflict_combo_box.setCurrentText(preset.get('conflict_strategy', 'Skip'))
+                self.simulation_checkbox.setChecked(preset.get('simulation_mode', False))
+                self.stop_on_error_checkbox.setChecked(preset.get('stop_on_error', False))
+                self.extension_line_edit.setText(preset.get('filter_extension', ''))
+                self.fix_checkbox.setChecked(preset.get('apply_fix', False))
+                self.subfolders_checkbox.setChecked(preset.get('include_subfolders', False))
+                self.max_depth_spinbox.setValue(preset.get('max_depth', 0))
+                self.numbering_per_folder_checkbox.setChecked(preset.get('numbering_per_folder', False))
+                self.sort_combo_box.setCurrentText(preset.get('sort_by', 'None'))
+                self.toggle_numbering_options()
+                self.preview_changes()
+                QMessageBox.information(self, 'Success', 'Preset loaded successfully!')
+            except Exception as e:
+                QMessageBox.critical(self, 'Error', f'Failed to load preset:\n{e}')
+
+
+def run(argv):
+    """ Show the window, then load the folder given as the first argument if any. """
+    app = QApplication(argv)
+    window = REnamer()
+    window.show()
+    folders = [arg for arg in app.arguments()[1:] if os.path.isdir(arg)]
+    if folders:
+        QTimer.singleShot(0, lambda: window.open_folder(os.path.abspath(folders[0])))
+    return app.exec()
+
+
+def main():
+    sys.exit(run(sys.argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import TRACE
+
+HASH_ALGORITHM = 'sha256'
+# Bytes hashed per step; smaller files are read in one go
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+# Files hashed concurrently; hashlib releases the GIL while digesting
+DEFAULT_HASH_WORKERS = 4
+
+
+def hash_file(path):
+    """
+    Hex digest of a file's contents, read in chunks into one reused buffer so
+    a multi-GB file is never held in memory. The file is read rather than
+    memory-mapped: a mapped file truncated while it is hashed kills the
+    process with SIGBUS. Raises OSError.
+    """
+    digest = hashlib.new(HASH_ALGORITHM)
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= HASH_CHUNK_SIZE:
+            digest.update(f.read())
+            return digest.hexdigest()
+        buffer = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        while True:
+            length = f.readinto(buffer)
+            if not length:
+                break
+            digest.update(view[:length])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    Digests that survive restarts, keyed by (path, inode, mtime, size): a file
+    is only read again after it changed. Stored as an append-only file with
+    one JSON line per digest, [path, inode, mtime, size, digest], later lines
+    winning; it is rewritten without the outdated lines when they pile up.
+    Thread-safe, since files are hashed on a pool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}  # Path -> (inode, mtime, size, digest)
+        lines = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break  # Torn last line
+                    try:
+                        file_path, inode, mtime, size, digest = json.loads(raw)
+                    except ValueError:
+                        continue
+                    self._entries[file_path] = (inode, mtime, size, digest)
+                    lines += 1
+        if lines > 2 * len(self._entries) + 1000:
+            self.compact()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+    def get(self, path, stat):
+        """ The digest of path if it was hashed with this (inode, mtime, size) stat key, else None. """
+        entry = self._entries.get(path)
+        if entry is not None and entry[:3] == tuple(stat):
+            return entry[3]
+        return None
+
+    def put(self, path, stat, digest):
+        with self._lock:
+            self._entries[path] = tuple(stat) + (digest,)
+            self._file.write(json.dumps([path, *stat, digest], ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def rename(self, pairs):
+        """ Keep the digests of renamed files; pairs are (old_path, new_path). """
+        for old_path, new_path in pairs:
+            entry = self._entries.get(old_path)
+            if entry is not None:
+                self.put(new_path, entry[:3], entry[3])
+
+    def compact(self):
+        """ Rewrite the file with only the current digest of every path. """
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for file_path, entry in self._entries.items():
+                    f.write(json.dumps([file_path, *entry], ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
+            if getattr(self, '_file', None) is not None:
+                self._file.close()
+                self._file = open(self.path, 'a', encoding='utf-8')
+
+
+def hash_files(folder, items, cache=None, workers=DEFAULT_HASH_WORKERS):
+    """
+    Digests of (name, stat) items, names relative to folder and stat their
+    (inode, mtime, size) key. Digests found in the HashCache cache are used
+    as they are; the other files are hashed on up to `workers` threads and
+    added to it. Returns {name: digest}, without the files that can't be read.
+    """
+    digests = {}
+    missing = []
+    for name, stat in items:
+        path = os.path.abspath(os.path.join(folder, name))
+        digest = cache.get(path, stat) if cache is not None else None
+        if digest is None:
+            missing.append((name, path, stat))
+        else:
+            digests[name] = digest
+    if not missing:
+        return digests
+
+    def digest_one(item):
+        name, path, stat = item
+        TRACE.count('hash')
+        try:
+            digest = hash_file(path)
+        except OSError:
+            return name, None
+        if cache is not None:
+            cache.put(path, stat, digest)
+        return name, digest
+
+    with TRACE.phase('hash') as phase, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for name, digest in pool.map(digest_one, missing):
+            if digest is not None:
+                digests[name] = digest
+        phase.add(len(missing))
+    return digests
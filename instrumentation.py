@@ -0,0 +1,131 @@
+import sys
+import json
+import time
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Phase runs kept for the exported trace; totals keep counting past it
+MAX_TRACE_EVENTS = 10000
+
+
+def max_rss_kb():
+    """ Memory high-water mark of the process in KiB, or None where it can't be read. """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss  # Bytes on macOS
+
+
+class _Phase:
+    """ One timed run of a phase; add() counts the files it handled. """
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.items = 0
+
+    def add(self, items):
+        self.items += items
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder._record(self, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    """ Stand-in returned while instrumentation is off. """
+
+    def add(self, items):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+class Instrumentation:
+    """
+    Opt-in counters for finding out where a slow run spends its time: wall time
+    and files per phase, system call counts and the memory high-water mark.
+    While disabled, phase() and count() return at once without recording.
+    Thread-safe, since scans, previews and renames run on worker threads.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}  # name -> [runs, seconds, items]
+            self.counters = {}
+            self.events = []
+            self.origin = time.perf_counter()
+            self.started = time.time()
+
+    def phase(self, name):
+        """ Context manager timing one run of a phase. """
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def _record(self, phase, seconds):
+        with self._lock:
+            totals = self.phases.setdefault(phase.name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += phase.items
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append({'phase': phase.name, 'start': round(phase.started - self.origin, 6),
+                                    'seconds': round(seconds, 6), 'items': phase.items,
+                                    'thread': threading.current_thread().name})
+
+    # Reporting
+
+    def snapshot(self):
+        """ Everything recorded so far as a JSON-ready dict. """
+        with self._lock:
+            phases = {name: {'runs': runs, 'seconds': round(seconds, 6), 'items': items,
+                             'per_second': round(items / seconds) if seconds and items else None}
+                      for name, (runs, seconds, items) in self.phases.items()}
+            return {'started': self.started, 'phases': phases, 'counters': dict(self.counters),
+                    'max_rss_kb': max_rss_kb(), 'events': list(self.events)}
+
+    def summary(self):
+        """ One line for a status bar. """
+        snapshot = self.snapshot()
+        parts = []
+        for name, phase in snapshot['phases'].items():
+            rate = f' ({phase["per_second"]:,}/s)' if phase['per_second'] else ''
+            parts.append(f'{name} {phase["seconds"]:.3f} s{rate}')
+        parts.extend(f'{name} ×{count:,}' for name, count in snapshot['counters'].items())
+        if snapshot['max_rss_kb'] is not None:
+            parts.append(f'peak {snapshot["max_rss_kb"] / 1024:.0f} MB')
+        return ' · '.join(parts) or 'Nothing measured yet'
+
+    def export(self, path):
+        """ Write the snapshot as a JSON trace. """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+
+# The process-wide instance the engine, the CLI and the GUI report to
+TRACE = Instrumentation()
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import threading
+
+from instrumentation import TRACE
+
+# Batches kept in the journal when it is compacted, i.e. how far undo can go back
+MAX_KEPT_BATCHES = 50
+
+
+def _load_record(raw):
+    """ The object on a journal line, None for a damaged line. """
+    try:
+        record = json.loads(raw)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+class JournalBatch:
+    """ Summary of one batch found in the journal. """
+
+    def __init__(self, batch_id, folder, steps, offset, started):
+        self.batch_id = batch_id
+        self.folder = folder
+        self.steps = steps
+        self.offset = offset  # File offset of the first step line
+        self.started = started
+        self.state = None  # None while incomplete, else the last 'end' state
+        self.undo_started = False
+
+
+class RenameJournal:
+    """
+    Append-only write-ahead log of rename batches, so an interrupted batch can be
+    completed or rolled back and undo survives restarts.
+
+    One JSON value per line, names relative to the batch folder:
+        {"begin": id, "folder": ..., "steps": n, "time": t}  batch header
+        [chain, src, dst]      n planned steps, written and synced before renaming
+        k                      step k (counted from 0) was renamed
+        -k-1                   step k was renamed back
+        {"undo": id}           an undo or rollback of batch id started
+        {"resume": id}         an interrupted batch id is being finished
+        {"end": id, "state": "committed" | "replayed" | "undone" | "rolled_back"}
+
+    Step records belong to the batch named by the closest header, undo or resume
+    record above them. Only the intent and the end of a batch are fsynced; step
+    records are just flushed, which is enough to survive a crash of the process.
+    The one step per chain that may have run without its record is detected on
+    disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.last_batch_id = None
+        self._next_id = 1
+        self._drop_torn_line()
+        for batch in self.batches():
+            self._next_id = batch.batch_id + 1
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _drop_torn_line(self):
+        """ Cut a last line left without its newline by a crash, so the next record starts on a line of its own. """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                chunk = f.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                f.truncate(position)
+
+    def close(self):
+        self._file.close()
+
+    def _write(self, line):
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def _sync(self):
+        TRACE.count('fsync')
+        with self._lock:
+            os.fsync(self._file.fileno())
+
+    # Writing
+
+    def begin(self, folder, chains):
+        """ Record the planned steps of a batch before any of them runs. Returns the batch id. """
+        batch_id = self._next_id
+        self._next_id += 1
+        steps = sum(len(chain) for chain in chains)
+        lines = [json.dumps({'begin': batch_id, 'folder': folder, 'steps': steps, 'time': time.time()})]
+        for number, chain in enumerate(chains):
+            lines.extend(json.dumps([number, src, dst], ensure_ascii=False) for src, dst, _ in chain)
+        self._write('\n'.join(lines) + '\n')
+        self._sync()
+        self.last_batch_id = batch_id
+        return batch_id
+
+    def step_done(self, step):
+        self._write(f'{step}\n')
+
+    def step_reverted(self, step):
+        self._write(f'{-step - 1}\n')
+
+    def end(self, batch_id, state):
+        self._write(json.dumps({'end': batch_id, 'state': state}) + '\n')
+        self._sync()
+
+    # Reading
+
+    def _iter_lines(self, start=0):
+        """ Yield (offset, line) for every complete line of the journal file from start. """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if raw.endswith(b'\n'):  # A torn last line is ignored
+                    yield offset, raw
+                offset += len(raw)
+
+    def batches(self):
+        """ All batches in the journal, oldest first. """
+        batches = {}
+        current = None
+        skip = 0
+        for offset, raw in self._iter_lines():
+            if skip:
+                skip -= 1
+                if not skip:
+                    current = None
+                continue
+            if raw[:1] != b'{':
+                continue  # Step records
+            record = _load_record(raw)
+            if record is None:
+                continue
+            if 'begin' in record:
+                try:
+                    current = JournalBatch(record['begin'], record['folder'], record['steps'],
+                                           offset + len(raw), record['time'])
+                except KeyError:
+                    continue
+                batches[current.batch_id] = current
+                skip = current.steps
+            elif 'undo' in record and record['undo'] in batches:
+                batches[record['undo']].undo_started = True
+            elif 'end' in record and record['end'] in batches:
+                batches[record['end']].state = record['state']
+        if skip:
+            del batches[current.batch_id]  # Intent cut short, none of its steps ran
+        return list(batches.values())
+
+    def get(self, batch_id):
+        for batch in self.batches():
+            if batch.batch_id == batch_id:
+                return batch
+        return None
+
+    def committed(self):
+        """ Batches that were applied and not undone, oldest first: the undo stack. """
+        return [b for b in self.batches() if b.state in ('committed', 'replayed')]
+
+    def incomplete(self):
+        """ Batches interrupted by a crash, including interrupted undos. """
+        return [b for b in self.batches() if b.state is None]
+
+    def _step_flags(self, batch):
+        """ bytearray with 1 for renamed steps and 2 for steps renamed back. """
+        flags = bytearray(batch.steps)
+        context = batch.batch_id
+        for offset, raw in self._iter_lines(batch.offset):
+            first = raw[:1]
+            if first == b'[':
+                continue
+            if first == b'{':
+                record = _load_record(raw)
+                if record is not None:
+                    context = record.get('begin', record.get('undo', record.get('resume', context)))
+                continue
+            if context != batch.batch_id:
+                continue
+            try:
+                step = int(raw)
+            except ValueError:
+                continue  # A damaged line, the step is then checked on disk
+            if not -batch.steps <= step < batch.steps:
+                continue
+            if step >= 0:
+                flags[step] = max(flags[step], 1)
+            else:
+                flags[-step - 1] = 2
+        return flags
+
+    def _iter_chains(self, batch):
+        """ Yield (first_step, [(src, dst), ...]) for each chain of batch, one chain in memory at a time. """
+        with open(self.path, 'rb') as f:
+            f.seek(batch.offset)
+            chain_number = None
+            first = 0
+            steps = []
+            for step in range(batch.steps):
+                number, src, dst = json.loads(f.readline())
+                if number != chain_number and steps:
+                    yield first, steps
+                    first = step
+                    steps = []
+                chain_number = number
+                steps.append((src, dst))
+            if steps:
+                yield first, steps
+
+    # Recovery and undo
+
+    def _revert(self, batch, state):
+        """
+        Rename every applied step of batch back, newest first within each chain.
+        Yields (old_path, new_path, error) per move: error is None when the move
+        was reverted.
+        """
+        flags = self._step_flags(batch)
+        self._write(json.dumps({'undo': batch.batch_id}) + '\n')
+        for first, steps in self._iter_chains(batch):
+            cycle = len(steps) > 1 and steps[0][1] == steps[-1][0]
+            # The first step without a record may still have happened just before a crash
+            for position, (src, dst) in enumerate(steps):
+                if not flags[first + position]:
+                    TRACE.count('exists')
+                    if not os.path.lexists(os.path.join(batch.folder, src)):
+                        flags[first + position] = 1
+                    break
+            for position in range(len(steps) - 1, -1, -1):
+                step = first + position
+                if flags[step] != 1:
+                    continue
+                src, dst = steps[position]
+                old_path = os.path.join(batch.folder, src)
+                new_path = os.path.join(batch.folder, dst)
+                # Moves through the temporary name are reported once, on the last step
+                report = not (cycle and position == len(steps) - 1)
+                report_pair = (old_path, os.path.join(batch.folder, steps[-1][1])) \
+                    if cycle and position == 0 else (old_path, new_path)
+                try:
+                    TRACE.count('exists')
+                    if os.path.lexists(new_path):
+                        TRACE.count('exists')
+                        if os.path.lexists(old_path):
+                            raise FileExistsError(f'{old_path} already exists')
+                        TRACE.count('rename')
+                        os.rename(new_path, old_path)
+                    elif not os.path.lexists(old_path):
+                        raise FileNotFoundError(f'{new_path} no longer exists')
+                    # else it was renamed back just before a crash
+                except OSError as e:
+                    yield report_pair + (e,)
+                    break
+                self.step_reverted(step)
+                if report:
+                    yield report_pair + (None,)
+        self.end(batch.batch_id, state)
+
+    def undo(self, batch_id):
+        """ Undo a committed batch; see _revert for what is yielded. """
+        batch = self.get(batch_id)
+        if batch is None:
+            return iter(())
+        return self._revert(batch, 'undone')
+
+    def rollback(self, batch):
+        return self._revert(batch, 'rolled_back')
+
+    def replay(self, batch):
+        """
+        Finish an interrupted batch by running its remaining steps in order.
+        Yields (old_path, new_path, error) per step that was run.
+        """
+        flags = self._step_flags(batch)
+        self._write(json.dumps({'resume': batch.batch_id}) + '\n')
+        for first, steps in self._iter_chains(batch):
+            for position, (src, dst) in enumerate(steps):
+                step = first + position
+                if flags[step]:
+                    continue
+                old_path = os.path.join(batch.folder, src)
+                new_path = os.path.join(batch.folder, dst)
+                try:
+                    TRACE.count('exists')
+                    if os.path.lexists(old_path):
+                        TRACE.count('rename')
+                        os.rename(old_path, new_path)
+                    elif not os.path.lexists(new_path):
+                        raise FileNotFoundError(f'{old_path} no longer exists')
+                    # else the step already ran just before the crash
+                except OSError as e:
+                    yield old_path, new_path, e
+                    break
+                self.step_done(step)
+                yield old_path, new_path, None
+        self.end(batch.batch_id, 'replayed')
+
+    def recover(self, replay=False):
+        """
+        Settle every interrupted batch: roll it back, or finish it when replay is
+        set. Interrupted undos are always finished. Returns a list of
+        (old_path, new_path, error) for the failures.
+        """
+        failures = []
+        for batch in self.incomplete():
+            if replay and not batch.undo_started:
+                results = self.replay(batch)
+            else:
+                results = self.rollback(batch)
+            failures.extend(result for result in results if result[2] is not None)
+        return failures
+
+    def compact(self, keep=MAX_KEPT_BATCHES):
+        """
+        Rewrite the journal with only the last `keep` committed batches, dropping
+        undone, rolled back and older ones. Incomplete batches are always kept.
+        """
+        batches = self.batches()
+        committed = [b for b in batches if b.state in ('committed', 'replayed')]
+        kept = {b.batch_id for b in committed[-keep:]}
+        kept.update(b.batch_id for b in batches if b.state is None)
+        if len(kept) == len(batches):
+            return
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as out, open(self.path, 'rb') as f:
+            for batch in batches:
+                if batch.batch_id not in kept:
+                    continue
+                flags = self._step_flags(batch)
+                out.write(json.dumps({'begin': batch.batch_id, 'folder': batch.folder,
+                                      'steps': batch.steps, 'time': batch.started}) + '\n')
+                f.seek(batch.offset)
+                for _ in range(batch.steps):
+                    out.write(f.readline().decode('utf-8'))
+                out.writelines(f'{step}\n' for step, flag in enumerate(flags) if flag)
+                if batch.undo_started:
+                    out.write(json.dumps({'undo': batch.batch_id}) + '\n')
+                    out.writelines(f'{-step - 1}\n' for step, flag in enumerate(flags) if flag == 2)
+                if batch.state is not None:
+                    out.write(json.dumps({'end': batch.batch_id, 'state': batch.state}) + '\n')
+            out.flush()
+            os.fsync(out.fileno())
+        with self._lock:
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
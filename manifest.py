@@ -0,0 +1,233 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+
+import engine
+from journal import RenameJournal
+
+# Jobs run at a time, over all disks
+DEFAULT_JOB_WORKERS = 4
+# Jobs run at a time on one disk (0 = no limit besides the job workers)
+DEFAULT_JOBS_PER_DEVICE = 1
+# Failed renames listed per job in the report, the others are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ManifestJob:
+    """ One folder of a manifest with the options it is renamed with. """
+
+    def __init__(self, number, folder, options, preset=None):
+        self.number = number  # Position in the manifest, from 1
+        self.folder = folder
+        self.options = options
+        self.preset = preset
+
+
+def load_manifest(path, **overrides):
+    """
+    Read a job manifest, a JSON file of the form
+        {"options": {...}, "jobs": [{"folder": ..., "preset": ..., "options": {...}}, ...]}
+    Every job starts from its preset file as saved by REnamer, then the
+    options at the top apply to all jobs and the options of a job to that job
+    alone, then overrides (None values ignored). preset and both options are
+    optional; relative paths are taken from the manifest's folder.
+    Raises OSError, or ValueError naming the bad job.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('jobs'), list):
+        raise ValueError(f'{path} has no "jobs" list')
+    shared = manifest.get('options') or {}
+    presets = {}  # Preset files shared by many jobs are read once
+    jobs = []
+    for number, entry in enumerate(manifest['jobs'], 1):
+        try:
+            preset = {}
+            if entry.get('preset'):
+                preset_file = os.path.join(base, entry['preset'])
+                if preset_file not in presets:
+                    with open(preset_file, 'r', encoding='utf-8') as f:
+                        presets[preset_file] = json.load(f)
+                preset.update(presets[preset_file])
+            preset.update(shared)
+            preset.update(entry.get('options') or {})
+            options = engine.make_options(preset, **overrides)
+            folder = os.path.normpath(os.path.join(base, entry['folder']))
+        except OSError as e:
+            raise ValueError(f'Job {number}: {e}') from e
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            raise ValueError(f'Job {number}: bad entry, {e!r}') from e
+        jobs.append(ManifestJob(number, folder, options, entry.get('preset')))
+    return jobs
+
+
+def device_of(folder):
+    """ The disk holding folder, None when it can't be read (the job then fails on its own). """
+    try:
+        return os.stat(folder).st_dev
+    except OSError:
+        return None
+
+
+def run_job(job, journal=None, journal_lock=None, hash_cache=None, workers=engine.DEFAULT_RENAME_WORKERS):
+    """ Scan, plan and commit one job. Returns its entry of the report. """
+    started = time.perf_counter()
+    options = job.options
+    result = {'job': job.number, 'folder': job.folder, 'preset': job.preset, 'status': 'done',
+              'files': 0, 'renamed': 0, 'failed': 0, 'errors': []}
+    journal = None if options['simulation_mode'] else journal
+    try:
+        names, index, stats = engine.scan_folder(job.folder, options, hash_cache)
+        result['files'] = len(names)
+        # The journal holds one batch at a time, so journaled jobs commit in turns; their scans still overlap
+        with journal_lock if journal is not None else nullcontext():
+            for history, errors in engine.rename_names(job.folder, names, index, options, workers=workers,
+                                                       journal=journal, stats=stats):
+                result['renamed'] += len(history)
+                result['failed'] += len(errors)
+                room = MAX_REPORTED_ERRORS - len(result['errors'])
+                result['errors'].extend([name, str(e)] for name, e in errors[:max(room, 0)])
+        if result['failed']:
+            result['status'] = 'failed'
+    except (OSError, re.error) as e:
+        result['status'] = 'error'
+        result['message'] = str(e)
+    except Exception as e:
+        # A bad option value (e.g. "numbering_padding": "3") fails its own job, not the whole run
+        result['status'] = 'error'
+        result['message'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def run_manifest(jobs, workers=DEFAULT_JOB_WORKERS, per_device=DEFAULT_JOBS_PER_DEVICE, journal=None,
+                 hash_cache=None, rename_workers=engine.DEFAULT_RENAME_WORKERS, progress=None):
+    """
+    Run jobs on up to `workers` threads, at most `per_device` of them on the
+    same disk, so folders sharing a disk don't fight over it while other
+    disks sit idle. The jobs of a disk start in manifest order and the disks
+    take turns. progress is called with the result of every finished job.
+    Returns the aggregate report.
+    """
+    started = time.perf_counter()
+    workers = max(1, workers)
+    per_device = per_device or workers
+    queues = OrderedDict()  # Device -> jobs not started yet
+    for job in jobs:
+        queues.setdefault(device_of(job.folder), deque()).append(job)
+    busy = dict.fromkeys(queues, 0)
+    journal_lock = threading.Lock()
+    running = {}  # Future -> device
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while queues or running:
+            # One job per disk and pass, until the workers or the disks are full
+            started_one = True
+            while started_one and len(running) < workers:
+                started_one = False
+                for device in list(queues):
+                    if len(running) >= workers:
+                        break
+                    if busy[device] >= per_device:
+                        continue
+                    job = queues[device].popleft()
+                    if not queues[device]:
+                        del queues[device]
+                    busy[device] += 1
+                    running[pool.submit(run_job, job, journal, journal_lock, hash_cache, rename_workers)] = device
+                    started_one = True
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                busy[running.pop(future)] -= 1
+                result = future.result()
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    results.sort(key=lambda result: result['job'])
+    return {
+        'jobs': len(results),
+        'done': sum(result['status'] == 'done' for result in results),
+        'failed': sum(result['status'] == 'failed' for result in results),
+        'errors': sum(result['status'] == 'error' for result in results),
+        'files': sum(result['files'] for result in results),
+        'renamed': sum(result['renamed'] for result in results),
+        'failed_renames': sum(result['failed'] for result in results),
+        'seconds': round(time.perf_counter() - started, 6),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='renamer-manifest', description='Rename many folders, each with its own preset, as listed in a '
+                                             'job manifest.')
+    parser.add_argument('manifest', help='Job manifest JSON file.')
+    parser.add_argument('--workers', type=int, default=DEFAULT_JOB_WORKERS, help='Jobs run at a time.')
+    parser.add_argument('--per-device', type=int, default=DEFAULT_JOBS_PER_DEVICE,
+                        help='Jobs run at a time on one disk (0 = no limit).')
+    parser.add_argument('--rename-workers', type=int, default=engine.DEFAULT_RENAME_WORKERS,
+                        help='Renames issued concurrently per job.')
+    parser.add_argument('--dry-run', dest='simulation_mode', action='store_true', default=None,
+                        help='Plan every job without renaming anything.')
+    parser.add_argument('--journal', help='Record renames in this journal file for crash recovery and undo.')
+    parser.add_argument('--hash-cache', help='Keep file digests in this file.')
+    parser.add_argument('-o', '--output', help='Write the report to this JSON file.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print the totals and failed jobs.')
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest, simulation_mode=args.simulation_mode)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+    journal = None
+    if args.journal:
+        journal = RenameJournal(args.journal)
+        for old_path, new_path, e in journal.recover():
+            print(f'Failed to recover {new_path}: {e}', file=sys.stderr)
+    hash_cache = None
+    if args.hash_cache:
+        from hashcache import HashCache
+        hash_cache = HashCache(args.hash_cache)
+    finished = []
+
+    def progress(result):
+        finished.append(result)
+        if args.quiet and result['status'] == 'done':
+            return
+        line = f'[{len(finished)}/{len(jobs)}] {result["status"]:<6} {result["folder"]}: '
+        if result['status'] == 'error':
+            line += result['message']
+        else:
+            line += f'{result["renamed"]} renamed, {result["failed"]} failed, {result["seconds"]:.2f} s'
+        print(line, file=sys.stderr)
+
+    try:
+        report = run_manifest(jobs, args.workers, args.per_device, journal, hash_cache, args.rename_workers,
+                              progress)
+    finally:
+        if journal is not None:
+            journal.close()
+        if hash_cache is not None:
+            hash_cache.close()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    action = 'Would rename' if all(job.options['simulation_mode'] for job in jobs) else 'Renamed'
+    print(f'{report["jobs"]} job(s) in {report["seconds"]:.2f} s: {report["done"]} done, {report["failed"]} with '
+          f'failed renames, {report["errors"]} not run. {action} {report["renamed"]} of {report["files"]} '
+          f'file(s), {report["failed_renames"]} failed.', file=sys.stderr)
+    return 0 if report['done'] == report['jobs'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
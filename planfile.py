@@ -0,0 +1,199 @@
+import os
+import csv
+import json
+
+import engine
+from instrumentation import TRACE
+
+PLAN_VERSION = 1
+# Columns of a plan record; target is empty when the file stays
+PLAN_FIELDS = ['old', 'new', 'target', 'action', 'message']
+# rename: to new; suffix: to a free '_N' name instead; overwrite: replacing the
+# file already at new; skip: new is taken; error: the plan can't rename the file
+PLAN_ACTIONS = ['rename', 'suffix', 'overwrite', 'skip', 'error']
+# The actions an applied plan renames
+MOVE_ACTIONS = {'rename', 'suffix', 'overwrite'}
+# First line of a CSV plan, followed by the header as JSON
+CSV_HEADER_PREFIX = '# renamer plan '
+
+
+def plan_format(path):
+    """ 'csv' for .csv files, 'jsonl' for anything else. """
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def plan_records(batch, moves, errors):
+    """ The records of one batch planned by engine.plan_batch, in batch order. """
+    resolved = {old_name: (new_name, overwrites) for old_name, new_name, overwrites in moves}
+    failed = dict(errors)
+    for old_name, planned_name in batch:
+        if old_name in resolved:
+            new_name, overwrites = resolved[old_name]
+            action = 'overwrite' if overwrites else 'rename' if new_name == planned_name else 'suffix'
+            yield {'old': old_name, 'new': planned_name, 'target': new_name, 'action': action, 'message': ''}
+        elif old_name in failed:
+            yield {'old': old_name, 'new': planned_name, 'target': '', 'action': 'error',
+                   'message': str(failed[old_name])}
+        else:
+            yield {'old': old_name, 'new': planned_name, 'target': '', 'action': 'skip',
+                   'message': f'{planned_name} already exists'}
+
+
+class PlanWriter:
+    """
+    Streams plan records to a JSONL or CSV file as they are planned, so a plan
+    of any size is never held in memory. Both start with a header holding the
+    folder, batch size and options: the first line of a JSONL plan, a
+    '# renamer plan {...}' line above the column names of a CSV plan.
+    counts holds the records written per action.
+    """
+
+    def __init__(self, path, folder, options, batch_size=engine.DEFAULT_BATCH_SIZE):
+        self.format = plan_format(path)
+        self.counts = dict.fromkeys(PLAN_ACTIONS, 0)
+        header = json.dumps({'renamer_plan': PLAN_VERSION, 'folder': os.path.abspath(folder),
+                             'batch_size': batch_size, 'options': options}, ensure_ascii=False)
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        if self.format == 'csv':
+            self._file.write(CSV_HEADER_PREFIX + header + '\n')
+            self._csv = csv.DictWriter(self._file, PLAN_FIELDS, lineterminator='\n')
+            self._csv.writeheader()
+        else:
+            self._file.write(header + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, records):
+        for record in records:
+            self.counts[record['action']] += 1
+            if self.format == 'csv':
+                self._csv.writerow(record)
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+def export_plan(path, folder, options, batch_size=engine.DEFAULT_BATCH_SIZE, processes=1, hash_cache=None):
+    """
+    Simulate a rename of folder and write every decision to the plan file at
+    path, batch by batch, without renaming anything. Returns the record
+    counts per action. Raises OSError and re.error like engine.rename_folder.
+    """
+    names, index, stats = engine.scan_folder(folder, options, hash_cache)
+    key = engine.sort_key(options['sort_by'], stats)
+    if key is not None:
+        names = sorted(names, key=key)
+    with PlanWriter(path, folder, options, batch_size) as writer:
+        for batch in engine.iter_plan(names, options, batch_size, processes, stats):
+            with TRACE.phase('plan') as phase:
+                moves, errors = engine.plan_batch(batch, index, options['conflict_strategy'])
+                phase.add(len(batch))
+            writer.write(plan_records(batch, moves, errors))
+    return writer.counts
+
+
+def read_plan(path):
+    """
+    Open a plan file. Returns (header, records), records being an iterator
+    of record dicts read as they are consumed; it closes the file at the end.
+    Raises OSError, or ValueError for a file that is not a plan.
+    """
+    f = open(path, 'r', encoding='utf-8', newline='')
+    try:
+        first = f.readline()
+        if plan_format(path) == 'csv':
+            if not first.startswith(CSV_HEADER_PREFIX):
+                raise ValueError(f'{path} is not a plan file')
+            first = first[len(CSV_HEADER_PREFIX):]
+        header = json.loads(first)
+        if not isinstance(header, dict) or header.get('renamer_plan') != PLAN_VERSION:
+            raise ValueError(f'{path} is not a plan file of version {PLAN_VERSION}')
+    except ValueError:
+        f.close()
+        raise
+
+    def records():
+        with f:
+            if plan_format(path) == 'csv':
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    return header, records()
+
+
+def apply_plan(path, folder=None, workers=engine.DEFAULT_RENAME_WORKERS, journal=None, simulation_mode=False,
+               stop_on_error=False):
+    """
+    Rename as recorded in a plan file, yielding (history, errors) per batch
+    like engine.rename_folder. Nothing is previewed or resolved again: the
+    folder (the plan's unless given) is only listed for the conflict checks,
+    and a file that is gone, or whose target was taken since the plan was
+    made, fails instead of being renamed elsewhere. Records are committed in
+    the batches they were planned in, so swaps and chains stay together.
+    """
+    header, records = read_plan(path)
+    folder = folder or header['folder']
+    options = engine.make_options(header.get('options'))
+    batch_size = header.get('batch_size') or engine.DEFAULT_BATCH_SIZE
+    with TRACE.phase('scan') as phase:
+        index = engine.NameIndex.from_folder(folder, options['include_subfolders'], options['max_depth'])
+        phase.add(len(index))
+
+    def commit(pending):
+        errors = []
+        moves = {}  # Old name -> record, of the records still to be renamed
+        for record in pending:
+            if record['old'] in index:
+                moves[record['old']] = record
+            else:
+                errors.append((record['old'], OSError(f'{record["old"]} no longer exists')))
+        # A target may only exist when its file moves away in this batch, and
+        # every record dropped here keeps its file in place, so check again
+        dropped = True
+        while dropped:
+            dropped = False
+            sources = {os.path.normcase(old_name) for old_name in moves}
+            for old_name, record in list(moves.items()):
+                target = record['target']
+                if record['action'] != 'overwrite' and target in index and os.path.normcase(target) not in sources:
+                    del moves[old_name]
+                    errors.append((old_name, engine.NameCollisionError(f'{target} exists, the plan is out of date')))
+                    dropped = True
+        batch = [(old_name, record['target']) for old_name, record in moves.items()]
+        overwrite = any(record['action'] == 'overwrite' for record in moves.values())
+        if errors and stop_on_error:
+            return [], errors
+        history, batch_errors = engine.commit_batch(folder, batch, index, 'Overwrite' if overwrite else 'Skip',
+                                                    simulation_mode, workers, stop_on_error, journal=journal)
+        errors.extend(batch_errors)
+        # Left out by the Skip strategy, should the folder change under the checks above
+        handled = {os.path.relpath(old_path, folder) for old_path, _ in history} | {name for name, _ in errors}
+        errors.extend((old_name, engine.NameCollisionError(f'{target} exists, the plan is out of date'))
+                      for old_name, target in batch if old_name not in handled)
+        return history, errors
+
+    pending = []
+    planned = 0
+    for record in records:
+        planned += 1
+        if record['action'] in MOVE_ACTIONS:
+            pending.append(record)
+        if planned == batch_size:
+            history, errors = commit(pending)
+            yield history, errors
+            if errors and stop_on_error:
+                records.close()
+                return
+            pending = []
+            planned = 0
+    if pending:
+        yield commit(pending)
@@ -0,0 +1,30 @@
+import os
+import sys
+import json
+
+# 🔹 Get the correct base directory (whether running as a script or as an .exe)
+if getattr(sys, 'frozen', False):
+    BASE_DIR = os.path.dirname(sys.executable)  # When running from .exe
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # When running as a script
+
+PRESET_FILE = os.path.join(BASE_DIR, 'preset.json')
+JOURNAL_FILE = os.path.join(BASE_DIR, 'rename_journal.jsonl')
+HASH_CACHE_FILE = os.path.join(BASE_DIR, 'hash_cache.jsonl')
+
+def save_preset():
+    """ Save preset settings to preset.json in the executable's directory. """
+    preset = {
+        'prefix': "example",
+        'suffix': "test",
+        'simulation_mode': True
+    }
+    with open(PRESET_FILE, 'w', encoding='utf-8') as f:
+        json.dump(preset, f)
+
+def load_preset():
+    """ Load preset settings from preset.json in the executable's directory. """
+    if os.path.exists(PRESET_FILE):
+        with open(PRESET_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
@@ -0,0 +1,64 @@
+import os
+import re
+import random
+
+import engine
+
+
+def reference_apply_fix(name):
+    """ apply_fix as it was before the single-pass rewrite, eight passes and a sentinel. """
+    new_name = name.strip()
+    placeholder = 'PLACEHOLDERDASH'
+    new_name = new_name.replace(' - ', placeholder)
+    new_name = re.sub(r'(?<!\s)-(?!\s)', ' ', new_name)
+    new_name = re.sub(r'\s{2,}', ' ', new_name)
+    new_name = new_name.replace(placeholder, ' - ')
+    new_name = re.sub(r'[^A-Za-z0-9\s\-]', '', new_name)
+    new_name = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', new_name)
+    new_name = re.sub(r'\s{2,}', ' ', new_name)
+    new_name = new_name.strip()
+    return new_name.title()
+
+
+EDGE_CASES = [
+    '', ' ', '-', '--', ' - ', ' - -', '- - ', ' -  - ', 'a - -b', 'a -- b', 'a--b', 'a---b', '-a-', 'a- b', 'a -b',
+    'a - b - c', 'a  -  b', 'a\t-\tb', 'a\t - \tb', 'tab\there', '\ta\t', 'a\n-b', 'a - \t-b',
+    'camelCase', 'CamelCaseName', 'iPhoneXSMax', 'mixedUP-case', 'abcDEF', 'a1B2c3',
+    'Über café', 'naïve-résumé', 'Ελλάδα - Москва', '東京-2024', 'ÀÉÎõü', 'straße',
+    'song (Live) [HD] {2019}!', 'IMG_20240101_000001', 'my.file.name', 'a_b-c d', '!!!', '   trailing   ',
+    'Artist - Title (feat. Someone)', 'already Title Case', 'UPPER - lower', 'x-y-z', '12-34 - 56',
+]
+
+# Pieces the random names are built from: the characters every pattern reacts to
+PIECES = ['a', 'b', 'Z', 'Q', '7', '-', '-', ' ', ' ', ' - ', '\t', '_', '.', '(', ')', '!', 'é', 'Ж', '東',
+          'camel', 'Case', 'word', 'IMG', ' -', '- ', '--']
+
+
+def test_edge_cases_match_reference():
+    for name in EDGE_CASES:
+        assert engine.apply_fix(name) == reference_apply_fix(name), repr(name)
+
+
+def test_random_names_match_reference():
+    rng = random.Random(12)
+    for _ in range(20000):
+        name = ''.join(rng.choice(PIECES) for _ in range(rng.randint(0, 12)))
+        assert engine.apply_fix(name) == reference_apply_fix(name), repr(name)
+
+
+def test_fix_stage_of_compiled_rules_matches_reference():
+    rng = random.Random(3)
+    names = [''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 10))) + '.txt' for _ in range(2000)]
+    rename_all = engine.compile_batch(engine.make_options(apply_fix=True))
+    expected = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        expected.append(reference_apply_fix(stem) + ext)
+    assert rename_all(names) == expected
+
+
+def test_sentinel_text_is_kept():
+    # The old implementation turned any 'PLACEHOLDERDASH' in a name into ' - '
+    assert reference_apply_fix('aPLACEHOLDERDASHb') == 'A - B'
+    assert engine.apply_fix('aPLACEHOLDERDASHb') == 'A Placeholderdashb'
+    assert engine.apply_fix('x PLACEHOLDERDASH y') == 'X Placeholderdash Y'
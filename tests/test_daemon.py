@@ -0,0 +1,89 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from daemon import RenameDaemon, submit
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / 'renamer.sock')
+    server = RenameDaemon(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, socket_path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_socket_is_private(daemon):
+    _, socket_path = daemon
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o077 == 0
+
+
+def test_ping(daemon):
+    _, socket_path = daemon
+    assert list(submit({'id': 1, 'command': 'ping'}, socket_path)) == [{'event': 'pong', 'id': 1}]
+
+
+def test_rename_job(daemon, tmp_path):
+    _, socket_path = daemon
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    for name in ('a.txt', 'b.txt'):
+        (folder / name).write_text(name)
+    job = {'id': 'job', 'folder': str(folder), 'options': {'prefix': 'x '}}
+    replies = list(submit(job, socket_path))
+    assert replies[-1]['event'] == 'done' and replies[-1]['renamed'] == 2
+    renamed = sorted(pair for reply in replies[:-1] for pair in reply['renamed'])
+    assert renamed == [['a.txt', 'x a.txt'], ['b.txt', 'x b.txt']]
+    assert sorted(os.listdir(folder)) == ['x a.txt', 'x b.txt']
+
+    # The warm listing follows files changed between jobs
+    (folder / 'c.txt').write_text('c')
+    os.remove(folder / 'x a.txt')
+    job['options'] = {'replace_text': 'x ', 'with_text': ''}
+    replies = list(submit(job, socket_path))
+    assert replies[-1]['event'] == 'done' and replies[-1]['failed'] == 0
+    assert sorted(os.listdir(folder)) == ['b.txt', 'c.txt']
+
+
+def test_bad_regex_is_an_error_reply(daemon, tmp_path):
+    _, socket_path = daemon
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    job = {'id': 2, 'folder': str(folder), 'options': {'replace_text': '(', 'use_regex': True}}
+    [reply] = list(submit(job, socket_path))
+    assert reply['event'] == 'error' and reply['id'] == 2
+    assert os.listdir(folder) == ['a.txt']
+
+
+def test_malformed_job_is_an_error_reply(daemon, tmp_path):
+    _, socket_path = daemon
+    [reply] = list(submit({'id': 3, 'options': {}}, socket_path))
+    assert reply['event'] == 'error' and reply['message'].startswith('Bad job')
+    [reply] = list(submit({'id': 4, 'command': 'reboot'}, socket_path))
+    assert reply['event'] == 'error'
+    # The connection handling survives both
+    assert list(submit({'id': 5, 'command': 'ping'}, socket_path)) == [{'event': 'pong', 'id': 5}]
+
+
+def test_stats_follow_changed_files(daemon, tmp_path):
+    _, socket_path = daemon
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    (folder / 'a').write_text('1')
+    (folder / 'b').write_text('22')
+    job = {'folder': str(folder), 'options': {'add_numbering': True, 'sort_by': 'Size', 'simulation_mode': True}}
+
+    def planned():
+        return sorted(pair for reply in submit(job, socket_path) if reply['event'] == 'batch'
+                      for pair in reply['renamed'])
+
+    assert planned() == [['a', '1a'], ['b', '2b']]
+    (folder / 'a').write_text('333')
+    assert planned() == [['a', '2a'], ['b', '1b']]
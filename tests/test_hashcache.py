@@ -0,0 +1,32 @@
+import hashlib
+
+import hashcache
+
+
+def test_chunked_digest_matches(tmp_path, monkeypatch):
+    monkeypatch.setattr(hashcache, 'HASH_CHUNK_SIZE', 4)
+    for size in (0, 3, 4, 5, 8, 13):
+        path = tmp_path / str(size)
+        data = bytes(range(size))
+        path.write_bytes(data)
+        assert hashcache.hash_file(str(path)) == hashlib.sha256(data).hexdigest()
+
+
+def test_file_truncated_while_hashed(tmp_path, monkeypatch):
+    # A mapped file would raise SIGBUS here; a read file just ends early
+    monkeypatch.setattr(hashcache, 'HASH_CHUNK_SIZE', 4)
+    path = tmp_path / 'shrinking'
+    path.write_bytes(b'0123456789')
+    digest = hashlib.sha256()
+    update = digest.update
+
+    class TruncatingHash:
+        def update(self, data):
+            update(data)
+            path.write_bytes(b'')
+
+        def hexdigest(self):
+            return digest.hexdigest()
+
+    monkeypatch.setattr(hashcache.hashlib, 'new', lambda name: TruncatingHash())
+    assert hashcache.hash_file(str(path)) == hashlib.sha256(b'0123').hexdigest()
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+import engine
+from journal import RenameJournal
+
+
+def test_batch_cut_short_by_an_exception_stays_open(tmp_path, monkeypatch):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        (folder / name).write_text(name)
+    journal = RenameJournal(str(tmp_path / 'journal.jsonl'))
+    rename = engine.DirectoryRenamer.rename
+    calls = []
+
+    def failing_rename(self, src, dst):
+        calls.append(src)
+        if len(calls) == 2:
+            raise RuntimeError('interrupted')
+        rename(self, src, dst)
+
+    monkeypatch.setattr(engine.DirectoryRenamer, 'rename', failing_rename)
+    batch = [('a.txt', 'x a.txt'), ('b.txt', 'x b.txt'), ('c.txt', 'x c.txt')]
+    with pytest.raises(RuntimeError):
+        engine.commit_batch(str(folder), batch, engine.NameIndex(os.listdir(folder)), workers=1, journal=journal)
+    monkeypatch.undo()
+
+    assert len(journal.incomplete()) == 1
+    assert journal.recover() == []
+    assert sorted(os.listdir(folder)) == ['a.txt', 'b.txt', 'c.txt']
+    assert journal.incomplete() == []
+    journal.close()
+
+
+def test_finished_batch_is_committed(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    journal = RenameJournal(str(tmp_path / 'journal.jsonl'))
+    history, errors = engine.commit_batch(str(folder), [('a.txt', 'b.txt')], engine.NameIndex(['a.txt']),
+                                          journal=journal)
+    assert len(history) == 1 and errors == []
+    assert journal.incomplete() == []
+    assert [batch.batch_id for batch in journal.committed()] == [journal.last_batch_id]
+    journal.close()
+
+
+def test_torn_last_line_is_dropped_on_open(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    (folder / 'a.txt').write_text('a')
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RenameJournal(path)
+    engine.commit_batch(str(folder), [('a.txt', 'b.txt')], engine.NameIndex(['a.txt']), journal=journal)
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"end": 1, "sta')  # A crash in the middle of a record
+
+    journal = RenameJournal(path)
+    (folder / 'c.txt').write_text('c')
+    history, errors = engine.commit_batch(str(folder), [('c.txt', 'd.txt')], engine.NameIndex(os.listdir(folder)),
+                                          journal=journal)
+    assert len(history) == 1 and errors == []
+    journal.close()
+
+    journal = RenameJournal(path)
+    assert journal.recover() == []
+    for batch in reversed(journal.committed()):
+        assert [error for _, _, error in journal.undo(batch.batch_id)] == [None]
+    assert sorted(os.listdir(folder)) == ['a.txt', 'c.txt']
+    journal.close()
+
+
+def test_damaged_lines_are_skipped(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    path.write_text('{"begin": 1, "folder": "f", "steps": 1, "time": 0}\n[0, "a", "b"]\nx\n{"end": 1\n0\n'
+                    '{"end": 1, "state": "committed"}\n')
+    journal = RenameJournal(str(path))
+    [batch] = journal.committed()
+    assert journal._step_flags(batch) == bytearray([1])
+    journal.close()
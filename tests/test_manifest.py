@@ -0,0 +1,20 @@
+import json
+
+import manifest
+
+
+def test_bad_job_options_fail_only_that_job(tmp_path):
+    for folder in ('good', 'bad'):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'file.txt').write_text('x')
+    (tmp_path / 'jobs.json').write_text(json.dumps({'jobs': [
+        {'folder': 'good', 'options': {'prefix': 'new '}},
+        {'folder': 'bad', 'options': {'add_numbering': True, 'numbering_padding': '3'}},
+    ]}))
+    jobs = manifest.load_manifest(str(tmp_path / 'jobs.json'))
+    report = manifest.run_manifest(jobs, workers=2)
+    assert [result['status'] for result in report['results']] == ['done', 'error']
+    assert 'TypeError' in report['results'][1]['message']
+    assert report['renamed'] == 1
+    assert (tmp_path / 'good' / 'new file.txt').exists()
+    assert (tmp_path / 'bad' / 'file.txt').exists()
@@ -0,0 +1,52 @@
+import os
+
+import engine
+
+
+def per_folder_options(**overrides):
+    return engine.make_options(add_numbering=True, numbering_position='Suffix', include_subfolders=True,
+                               numbering_per_folder=True, **overrides)
+
+
+def test_per_folder_numbers_do_not_need_adjacent_rows():
+    names = [os.path.join('a', '1.txt'), os.path.join('b', '2.txt'),
+             os.path.join('a', '3.txt'), os.path.join('b', '4.txt'), 'top.txt']
+    assert list(engine.number_column(names, per_folder_options())) == [1, 1, 2, 2, 1]
+    assert list(engine.number_column(names, per_folder_options(numbering_start=5, numbering_increment=10),
+                                     selected_rows={0, 2, 3})) == [5, None, 15, 5, None]
+
+
+def test_sorted_per_folder_numbering(tmp_path):
+    # Sorted by size the two folders interleave: a/1, b/2, a/3, b/4
+    for size, name in enumerate(['a/1.txt', 'b/2.txt', 'a/3.txt', 'b/4.txt'], 1):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'x' * size)
+    options = per_folder_options(sort_by='Size', simulation_mode=True)
+    renamed = {os.path.relpath(old_path, tmp_path): os.path.relpath(new_path, tmp_path)
+               for history, _ in engine.rename_folder(str(tmp_path), options) for old_path, new_path in history}
+    assert renamed == {
+        os.path.join('a', '1.txt'): os.path.join('a', '11.txt'),
+        os.path.join('b', '2.txt'): os.path.join('b', '21.txt'),
+        os.path.join('a', '3.txt'): os.path.join('a', '32.txt'),
+        os.path.join('b', '4.txt'): os.path.join('b', '42.txt'),
+    }
+
+
+def test_preview_rows_match_full_pass():
+    names = [os.path.join('a', 'x.txt'), os.path.join('b', 'y.txt'), os.path.join('a', 'z.txt')]
+    options = per_folder_options()
+    full = [preview for _, chunk in engine.iter_previews(names, options) for preview in chunk]
+    assert engine.preview_rows(names, [2], options) == {2: full[2]}
+    assert full[2] == os.path.join('a', 'z2.txt')
+
+
+def test_preview_rows_need_only_their_names_for_positional_numbers():
+    names = [f'{i}.txt' for i in range(10)]
+    options = engine.make_options(add_numbering=True, numbering_start=3, prefix='x')
+    rows = [2, 7]
+    assert not engine.numbers_depend_on_names(options)
+    assert engine.preview_rows({row: names[row] for row in rows}, rows, options) == \
+        engine.preview_rows(names, rows, options) == {2: '5x2.txt', 7: '10x7.txt'}
+    assert engine.numbers_depend_on_names(options, selected_rows={2})
+    assert engine.numbers_depend_on_names(per_folder_options())
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import engine
+from planfile import export_plan, apply_plan, read_plan
+
+
+def make_folder(tmp_path, names):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    for name in names:
+        (folder / name).write_text(name)
+    return folder
+
+
+def disk_contents(folder):
+    return {name: (folder / name).read_text() for name in os.listdir(folder)}
+
+
+def apply(path):
+    history = []
+    errors = []
+    for batch_history, batch_errors in apply_plan(path):
+        history.extend(batch_history)
+        errors.extend(batch_errors)
+    return history, errors
+
+
+@pytest.mark.parametrize('extension', ['.jsonl', '.csv'])
+def test_round_trip(tmp_path, extension):
+    # 'x a.txt' is both a target and a source, so the plan holds a chain
+    folder = make_folder(tmp_path, ['a.txt', 'b.txt', 'x a.txt'])
+    path = str(tmp_path / ('plan' + extension))
+    counts = export_plan(path, str(folder), engine.make_options({'prefix': 'x '}))
+    assert counts['rename'] == 3
+    assert sorted(os.listdir(folder)) == ['a.txt', 'b.txt', 'x a.txt']  # Exporting renames nothing
+    header, records = read_plan(path)
+    assert header['folder'] == str(folder)
+    assert sorted((record['old'], record['target']) for record in records) == \
+        [('a.txt', 'x a.txt'), ('b.txt', 'x b.txt'), ('x a.txt', 'x x a.txt')]
+
+    history, errors = apply(path)
+    assert errors == [] and len(history) == 3
+    assert disk_contents(folder) == {'x a.txt': 'a.txt', 'x b.txt': 'b.txt', 'x x a.txt': 'x a.txt'}
+
+
+@pytest.mark.parametrize('extension', ['.jsonl', '.csv'])
+def test_source_gone_since_the_export_fails(tmp_path, extension):
+    folder = make_folder(tmp_path, ['a.txt', 'b.txt'])
+    path = str(tmp_path / ('plan' + extension))
+    export_plan(path, str(folder), engine.make_options({'prefix': 'x '}))
+    os.remove(folder / 'a.txt')
+
+    history, errors = apply(path)
+    assert [name for name, _ in errors] == ['a.txt']
+    assert disk_contents(folder) == {'x b.txt': 'b.txt'}
+
+
+@pytest.mark.parametrize('extension', ['.jsonl', '.csv'])
+def test_target_taken_since_the_export_fails(tmp_path, extension):
+    folder = make_folder(tmp_path, ['a.txt', 'b.txt'])
+    path = str(tmp_path / ('plan' + extension))
+    export_plan(path, str(folder), engine.make_options({'prefix': 'x ', 'conflict_strategy': 'Rename'}))
+    (folder / 'x a.txt').write_text('new')
+
+    history, errors = apply(path)
+    assert [name for name, _ in errors] == ['a.txt']
+    assert isinstance(errors[0][1], engine.NameCollisionError)
+    # Not renamed to a free name instead, even though the plan was made with Rename
+    assert disk_contents(folder) == {'a.txt': 'a.txt', 'x a.txt': 'new', 'x b.txt': 'b.txt'}
@@ -0,0 +1,119 @@
+import os
+import random
+
+import pytest
+
+import engine
+
+
+def make_files(folder, names):
+    for name in names:
+        (folder / name).write_text(name)
+
+
+def disk_contents(folder):
+    return {name: (folder / name).read_text() for name in os.listdir(folder)}
+
+
+def assert_index_matches_disk(index, folder):
+    names = os.listdir(folder)
+    assert len(index) == len(names)
+    assert all(name in index for name in names)
+
+
+def commit(folder, batch, strategy='Skip', index=None):
+    index = index if index is not None else engine.NameIndex(os.listdir(folder))
+    history, errors = engine.commit_batch(str(folder), batch, index, strategy)
+    return index, history, errors
+
+
+def test_swap(tmp_path):
+    make_files(tmp_path, ['a', 'b'])
+    index, history, errors = commit(tmp_path, [('a', 'b'), ('b', 'a')])
+    assert errors == [] and len(history) == 2
+    assert disk_contents(tmp_path) == {'a': 'b', 'b': 'a'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_chain(tmp_path):
+    make_files(tmp_path, ['f1', 'f2', 'f3'])
+    index, history, errors = commit(tmp_path, [('f1', 'f2'), ('f2', 'f3'), ('f3', 'f4')])
+    assert errors == [] and len(history) == 3
+    assert disk_contents(tmp_path) == {'f2': 'f1', 'f3': 'f2', 'f4': 'f3'}
+    assert_index_matches_disk(index, tmp_path)
+    # f2 is still taken for the next batch
+    index, history, errors = commit(tmp_path, [('f4', 'f2')], index=index)
+    assert history == [] and disk_contents(tmp_path)['f2'] == 'f1'
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_cycle(tmp_path):
+    make_files(tmp_path, ['a', 'b', 'c'])
+    index, history, errors = commit(tmp_path, [('a', 'b'), ('b', 'c'), ('c', 'a')])
+    assert errors == [] and len(history) == 3
+    assert disk_contents(tmp_path) == {'b': 'a', 'c': 'b', 'a': 'c'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_target_claimed_earlier_in_the_batch(tmp_path):
+    # b moves away, so a may take it; c wants it too and must be skipped
+    make_files(tmp_path, ['a', 'b', 'c'])
+    index, history, errors = commit(tmp_path, [('a', 'b'), ('b', 'x'), ('c', 'b')])
+    assert disk_contents(tmp_path) == {'b': 'a', 'x': 'b', 'c': 'c'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_overwrite_refuses_a_target_claimed_twice(tmp_path):
+    make_files(tmp_path, ['a', 'b', 'c'])
+    index, history, errors = commit(tmp_path, [('a', 'b'), ('b', 'x'), ('c', 'b')], 'Overwrite')
+    assert [name for name, _ in errors] == ['c']
+    assert disk_contents(tmp_path) == {'b': 'a', 'x': 'b', 'c': 'c'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_skip_cascade(tmp_path):
+    # taken stays, so c -> b -> a can't free their names either
+    make_files(tmp_path, ['a', 'b', 'c', 'taken'])
+    index, history, errors = commit(tmp_path, [('a', 'taken'), ('b', 'a'), ('c', 'b')])
+    assert history == [] and errors == []
+    assert disk_contents(tmp_path) == {'a': 'a', 'b': 'b', 'c': 'c', 'taken': 'taken'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+def test_failed_step_releases_blocked_steps(tmp_path, monkeypatch):
+    make_files(tmp_path, ['f1', 'f2', 'f3'])
+    rename = engine.DirectoryRenamer.rename
+
+    def failing_rename(self, src, dst):
+        if src == 'f2':
+            raise PermissionError('denied')
+        rename(self, src, dst)
+
+    monkeypatch.setattr(engine.DirectoryRenamer, 'rename', failing_rename)
+    index, history, errors = commit(tmp_path, [('f1', 'f2'), ('f2', 'f3'), ('f3', 'f4')])
+    monkeypatch.undo()
+    assert sorted(name for name, _ in errors) == ['f1', 'f2']
+    assert disk_contents(tmp_path) == {'f1': 'f1', 'f2': 'f2', 'f4': 'f3'}
+    assert_index_matches_disk(index, tmp_path)
+
+
+@pytest.mark.parametrize('strategy', ['Skip', 'Rename', 'Overwrite'])
+def test_random_batches_keep_files_and_index(tmp_path, strategy):
+    rng = random.Random(strategy)
+    for trial in range(150):
+        folder = tmp_path / str(trial)
+        folder.mkdir()
+        names = [f'f{i}' for i in rng.sample(range(12), rng.randint(2, 8))]
+        make_files(folder, names)
+        index = engine.NameIndex(names)
+        for _ in range(3):
+            current = os.listdir(folder)
+            sources = rng.sample(current, rng.randint(1, len(current)))
+            batch = [(name, f'f{rng.randrange(12)}') for name in sources]
+            batch = [(old, new) for old, new in batch if old != new]
+            before = disk_contents(folder)
+            engine.commit_batch(str(folder), batch, index, strategy)
+            after = disk_contents(folder)
+            if strategy != 'Overwrite':
+                assert sorted(after.values()) == sorted(before.values()), batch
+            assert_index_matches_disk(index, folder)
@@ -0,0 +1,32 @@
+import os
+
+import engine
+
+
+def test_revert_history_without_listing_the_folder(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    for name, text in [('a', 'A'), ('b', 'B'), ('new c', 'C'), ('new d', 'D'), ('d', 'taken'),
+                       ('.a.renamer-tmp', 'parked a'), ('.b.renamer-tmp', 'parked b')]:
+        (tmp_path / name).write_text(text)
+
+    def no_listing(*args):
+        raise AssertionError('the folder was listed')
+
+    monkeypatch.setattr(engine.os, 'scandir', no_listing)
+    monkeypatch.setattr(engine.os, 'listdir', no_listing)
+    path = os.path.join
+    # a and b were swapped, c and d renamed; something took d's old name since
+    history = [(path(folder, 'a'), path(folder, 'b')), (path(folder, 'b'), path(folder, 'a')),
+               (path(folder, 'c'), path(folder, 'new c')), (path(folder, 'd'), path(folder, 'new d'))]
+    reverted, errors = engine.revert_history(history)
+    monkeypatch.undo()
+
+    assert sorted(reverted) == sorted(history[:3])
+    assert [(name, type(e)) for name, e in errors] == [(path(folder, 'new d'), FileExistsError)]
+    assert (tmp_path / 'a').read_text() == 'B'
+    assert (tmp_path / 'b').read_text() == 'A'
+    assert (tmp_path / 'c').read_text() == 'C'
+    assert (tmp_path / 'new d').read_text() == 'D'
+    # Whichever file the cycle parks, an existing temporary name is not overwritten
+    assert (tmp_path / '.a.renamer-tmp').read_text() == 'parked a'
+    assert (tmp_path / '.b.renamer-tmp').read_text() == 'parked b'
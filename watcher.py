@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+import engine
+
+# Seconds between two listings of the polling watcher
+POLL_INTERVAL = 2.0
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# Changes reported by the watchers, names relative to the watched folder:
+#   ('created', name, None)   ('deleted', name, None)   ('moved', old_name, new_name)
+#   ('deleted_dir', name, None)  a folder and everything listed below it is gone
+#   ('modified', name, None)     its contents or times changed (inotify only)
+#   ('overflow', None, None)     events were lost, the folder has to be read again
+
+
+class PollingWatcher:
+    """ Finds changes by listing the folder again every POLL_INTERVAL seconds. Moves show up as delete + create. """
+
+    def __init__(self, folder, include_subfolders=False, max_depth=0, interval=POLL_INTERVAL):
+        self.folder = folder
+        self.include_subfolders = include_subfolders
+        self.max_depth = max_depth
+        self.interval = interval
+        self._names = self._list()
+        self._next_poll = time.monotonic() + interval
+
+    def _list(self):
+        return set(engine.list_files(self.folder, include_subfolders=self.include_subfolders,
+                                     max_depth=self.max_depth))
+
+    def read(self, timeout):
+        """ Wait up to timeout seconds and return the changes found, possibly none. """
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, delay))
+        self._next_poll = time.monotonic() + self.interval
+        try:
+            names = self._list()
+        except OSError:
+            return []  # Try again on the next poll
+        changes = [('deleted', name, None) for name in self._names - names]
+        changes.extend(('created', name, None) for name in names - self._names)
+        self._names = names
+        return changes
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Reports changes as the kernel sees them through inotify, watching every
+    listed folder. Linux only; raises OSError when inotify is unavailable or
+    out of watches, see open_watcher.
+    """
+
+    def __init__(self, folder, include_subfolders=False, max_depth=0):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+        self.folder = folder
+        self.include_subfolders = include_subfolders
+        self.max_depth = max_depth
+        self._dirs = {}  # Watch descriptor -> folder relative to self.folder
+        self._moved_from = {}  # Cookie -> (name, is_dir) until the matching IN_MOVED_TO shows up
+        try:
+            self._watch('')
+            if include_subfolders:
+                for relative_dir, _, _ in engine.walk_parallel(folder, max_depth):
+                    if relative_dir:
+                        self._watch(relative_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, relative_dir):
+        path = os.path.join(self.folder, relative_dir) if relative_dir else self.folder
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, f'Cannot watch {path}: {os.strerror(e)}')
+        self._dirs[wd] = relative_dir
+
+    def _unwatch(self, relative_dir):
+        """ Drop the watches of a folder that moved or vanished, and of everything below it. """
+        prefix = relative_dir + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == relative_dir or path.startswith(prefix):
+                self._rm_watch(self.fd, wd)
+                del self._dirs[wd]
+
+    def _depth(self, relative_dir):
+        return relative_dir.count(os.sep) + 1 if relative_dir else 0
+
+    def _dir_appeared(self, name):
+        """ Watch a folder that was created or moved in and report the files already in it. """
+        changes = []
+        levels_left = self.max_depth - self._depth(name)
+        if self.max_depth and levels_left < 0:
+            return changes
+        path = os.path.join(self.folder, name)
+        try:
+            self._watch(name)
+            if self.max_depth and not levels_left:
+                # walk_parallel has no way to say "this folder only"
+                with os.scandir(path) as it:
+                    walk = [('', None, [entry.name for entry in it if not entry.is_dir()])]
+            else:
+                walk = engine.walk_parallel(path, levels_left if self.max_depth else 0)
+            for relative_dir, _, files in walk:
+                if relative_dir:
+                    self._watch(os.path.join(name, relative_dir))
+                changes.extend(('created', os.path.join(name, relative_dir, file), None) for file in files)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                return [('overflow', None, None)]  # Out of watches
+        return changes
+
+    def _entry_changes(self, kind, name, is_dir):
+        if not is_dir or not self.include_subfolders:
+            return [(kind, name, None)]  # Folders are only listed as entries in flat mode
+        if kind == 'created':
+            return self._dir_appeared(name)
+        self._unwatch(name)
+        return [('deleted_dir', name, None)]
+
+    def read(self, timeout):
+        """ Wait up to timeout seconds and return the changes found, possibly none. """
+        changes = []
+        # A move out of the folder has no IN_MOVED_TO; it is settled one read later
+        for name, is_dir in self._moved_from.values():
+            changes.extend(self._entry_changes('deleted', name, is_dir))
+        self._moved_from = {}
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changes
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                raw_name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                changes.extend(self._event(wd, mask, cookie, os.fsdecode(raw_name)))
+        return changes
+
+    def _event(self, wd, mask, cookie, name):
+        if mask & IN_Q_OVERFLOW:
+            return [('overflow', None, None)]
+        if mask & IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return []
+        relative_dir = self._dirs.get(wd)
+        if relative_dir is None:
+            return []
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # The watched folder itself is gone; its parent reports it, unless it is the top one
+            return [] if relative_dir else [('overflow', None, None)]
+        name = os.path.join(relative_dir, name) if relative_dir else name
+        is_dir = bool(mask & IN_ISDIR)
+        if mask & IN_MOVED_FROM:
+            self._moved_from[cookie] = (name, is_dir)
+            return []
+        if mask & IN_MOVED_TO:
+            moved = self._moved_from.pop(cookie, None)
+            if moved is None:
+                return self._entry_changes('created', name, is_dir)
+            if is_dir and self.include_subfolders:
+                return self._entry_changes('deleted', moved[0], True) + self._entry_changes('created', name, True)
+            return [('moved', moved[0], name)]
+        if mask & IN_CREATE:
+            return self._entry_changes('created', name, is_dir)
+        if mask & IN_DELETE:
+            return self._entry_changes('deleted', name, is_dir)
+        if mask & (IN_CLOSE_WRITE | IN_ATTRIB) and not is_dir:
+            return [('modified', name, None)]
+        return []
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(folder, include_subfolders=False, max_depth=0):
+    """ An InotifyWatcher where the platform supports it, else a PollingWatcher. """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder, include_subfolders, max_depth)
+        except (OSError, AttributeError):  # No inotify in libc, or out of watches
+            pass
+    return PollingWatcher(folder, include_subfolders, max_depth)